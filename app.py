@@ -1,11 +1,18 @@
-from flask import Flask, render_template, request, redirect, session, url_for
+from flask import Flask, Response, jsonify, render_template, request, redirect, session, stream_with_context, url_for
+import json
 import os
 from dotenv import load_dotenv
 
 # Import our custom modules
-from auth import get_authorization_url, exchange_code_for_credentials, credentials_to_dict
-from calendar_api import get_optimized_free_slots, get_existing_events_for_ai, insert_event, update_free_slots_after_scheduling
-from gpt_parser import ai_schedule_tasks, parse_tasks_with_gpt
+from auth import get_authorization_url, exchange_code_for_credentials
+from calendar_api import insert_events, primary_calendar_id
+from gpt_parser import ai_schedule_tasks
+from scheduler import local_batch_schedule, validate_and_repair_schedule
+from pipeline import fetch_scheduling_inputs
+from jobs import TooManyJobsError, get_job, job_events, submit_scheduling_job
+from models import parse_minutes, to_datetime
+import credential_store
+import metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,6 +21,12 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'  # Allow HTTP for local developm
 app = Flask(__name__)
 app.secret_key = 'super_secret_key'  # Replace with a secure key in production
 
+# Scheduling pipeline used when the form doesn't pick one:
+# "agentic" = parse then schedule (two GPT calls), "fused" = parse and schedule in one GPT call,
+# "local" = GPT parse, then the deterministic local scheduler
+PIPELINES = ('agentic', 'fused', 'local')
+DEFAULT_PIPELINE = os.getenv('SCHEDULING_PIPELINE', 'agentic')
+
 # Home page
 @app.route('/')
 def index():
@@ -25,53 +38,78 @@ def login():
     auth_url = get_authorization_url()
     return redirect(auth_url)
 
-# Handles Google's OAuth2 callback and stores credentials in session
+# Handles Google's OAuth2 callback; the credentials stay server-side and the session only holds the user's key
 @app.route('/callback')
 def callback():
     credentials = exchange_code_for_credentials(request.url)
-    session['credentials'] = credentials_to_dict(credentials)
+    # No tokens or client secret in the cookie: the live token is kept (and refreshed) in credential_store
+    session['user'] = credential_store.save_credentials(credentials, primary_calendar_id(credentials))
     return redirect(url_for('chat'))
 
 # Chat interface shown after login
 @app.route('/chat', methods=['GET', 'POST'])
 def chat():
-    if 'credentials' not in session:
+    if 'user' not in session:
         return redirect(url_for('index'))
 
-    result_html = ""
+    result = None
 
     if request.method == 'POST':
         user_input = request.form['task_input']
         user_priority = request.form['priority']
+        pipeline = request.form.get('pipeline', DEFAULT_PIPELINE)
+        if pipeline not in PIPELINES:
+            pipeline = DEFAULT_PIPELINE
 
         try:
-            # Step 1: Get free slots from Google Calendar with optimized date range based on user input
-            multi_day_slots = get_optimized_free_slots(session['credentials'], user_input)
-
-            # Step 1.5: Get existing events to provide context for AI scheduling  
-            from datetime import datetime
-            from calendar_api import analyze_user_input_for_date_range
-            start_date, num_days = analyze_user_input_for_date_range(user_input) if user_input else (datetime.now(), 3)
-            existing_events = get_existing_events_for_ai(session['credentials'], start_date, num_days)
-
-            # Step 2: Parse tasks using AI to get individual tasks with priorities
-            from gpt_parser import parse_tasks_with_gpt, agentic_batch_schedule
-            parsed_tasks = parse_tasks_with_gpt(user_input, user_priority)
-            
-            print(f"DEBUG: Parsed {len(parsed_tasks)} tasks, now using agentic batch scheduling...")
-            print(f"DEBUG: Found {sum(len(events) for events in existing_events.values())} existing events to avoid conflicts")
-            
-            # Step 3: Use AGENTIC AI to schedule ALL tasks 
-            scheduled_tasks, skipped_tasks, optimization_summary, schedule_insights = agentic_batch_schedule(
-                parsed_tasks, 
-                user_priority, 
-                multi_day_slots,
-                existing_events
+            # Steps 1-2: Free slots, existing events and the GPT task parse don't depend on
+            # each other, so they are fetched concurrently (the fused pipeline parses later)
+            multi_day_slots, existing_events, parsed_tasks = fetch_scheduling_inputs(
+                session['user'],
+                user_input,
+                user_priority,
+                parse=(pipeline != 'fused')
             )
+
+            from gpt_parser import agentic_batch_schedule
+            with metrics.span('schedule', pipeline=pipeline):
+                if pipeline == 'fused':
+                    # Steps 2+3 in one completion: parse and schedule together
+                    scheduled_tasks, skipped_tasks, optimization_summary, schedule_insights = ai_schedule_tasks(
+                        user_input,
+                        user_priority,
+                        multi_day_slots,
+                        existing_events
+                    )
+                else:
+                    print(f"DEBUG: Parsed {len(parsed_tasks)} tasks, now using {pipeline} batch scheduling...")
+                    print(f"DEBUG: Found {sum(len(events) for events in existing_events.values())} existing events to avoid conflicts")
+                
+                    # Step 3: Schedule ALL tasks, either locally or with AGENTIC AI
+                    schedule = local_batch_schedule if pipeline == 'local' else agentic_batch_schedule
+                    scheduled_tasks, skipped_tasks, optimization_summary, schedule_insights = schedule(
+                        parsed_tasks, 
+                        user_priority, 
+                        multi_day_slots,
+                        existing_events
+                    )
             
-            print(f"DEBUG: Agentic AI scheduled {len(scheduled_tasks)} tasks")
+            print(f"DEBUG: {pipeline} pipeline scheduled {len(scheduled_tasks)} tasks")
             print(f"DEBUG: Optimization Summary: {optimization_summary}")
             
+            # Step 3.5: Check the schedule against the calendar and repair conflicts locally before inserting
+            with metrics.span('validate'):
+                scheduled_tasks, invalid_tasks, repairs = validate_and_repair_schedule(
+                    scheduled_tasks,
+                    multi_day_slots,
+                    existing_events,
+                    parsed_tasks
+                )
+            skipped_tasks = list(skipped_tasks) + invalid_tasks
+            schedule_insights = list(schedule_insights or []) + repairs
+            for repair in repairs:
+                print(f"DEBUG: Repair: {repair}")
+            
             for task in scheduled_tasks:
                 print(f"DEBUG: {task['task_name']} → {task['start']} to {task['end']} ({task.get('status', 'scheduled')})")
             
@@ -80,56 +118,116 @@ def chat():
                     print(f"DEBUG: Skipped: {skipped['task_name']} - {skipped['reason']}")
 
             # Step 4: Schedule tasks - AI has already resolved conflicts in Step 3
-            links = []
-            
-            for task in scheduled_tasks:
-                event_link = insert_event(session['credentials'], task)
-                status = task.get("status", "on-time")
-                reasoning = task.get("reasoning", "")
-                
-                # Extract date from start time for display
-                from datetime import datetime
-                start_time = datetime.fromisoformat(task['start'].replace('+05:30', ''))
-                task_date = start_time.strftime("%A, %B %d")
-                
-                links.append(f"{task['task_name']} on {task_date} ({status}): <a href='{event_link}' target='_blank'>View Event</a><br><small><em>{reasoning}</em></small>")
-
-            # Step 4: Build HTML result with AI optimization summary
-            result_html += f"<h3>🧠 AI Scheduling Intelligence:</h3>"
-            result_html += f"<p><strong>Optimization Strategy:</strong> {optimization_summary}</p>"
-            
-            if schedule_insights:
-                result_html += "<h4>💡 Key Scheduling Insights:</h4><ul>"
-                for insight in schedule_insights:
-                    result_html += f"<li>{insight}</li>"
-                result_html += "</ul>"
+            # All events go to Google Calendar in one batch request; failures are reported per task
+            tasks = []
+            insert_results = insert_events(session['user'], scheduled_tasks)
             
-            result_html += "<h3>📅 Scheduled Tasks (AI-Optimized Multi-Day Schedule):</h3><ul>"
-            for link in links:
-                result_html += f"<li>{link}</li>"
-            result_html += "</ul>"
-
-            # AI scheduling feedback
-            late_tasks = [t for t in scheduled_tasks if t.get("status") == "late"]
-            if late_tasks:
-                result_html += "<h3>Tasks Scheduled After Deadline:</h3><ul>"
-                for t in late_tasks:
-                    result_html += f"<li>{t['task_name']} → Scheduled at {t['start']}<br><small><em>AI Reasoning: {t.get('reasoning', 'Optimized placement')}</em></small></li>"
-                result_html += "</ul>"
-
-            if skipped_tasks:
-                result_html += "<h3>Tasks That Couldn't Be Scheduled:</h3><ul>"
-                for t in skipped_tasks:
-                    result_html += f"<li>{t.get('task_name', 'Unknown task')} - {t.get('reason', 'No available time slots')}</li>"
-                result_html += "</ul>"
-
-            if not late_tasks and not skipped_tasks:
-                result_html += "<h3>Perfect Agentic Schedule! AI optimally scheduled all tasks with global intelligence!</h3>"
+            for task, inserted in zip(scheduled_tasks, insert_results):
+                if inserted['error']:
+                    print(f"DEBUG: Failed to insert {task['task_name']}: {inserted['error']}")
+                tasks.append({
+                    'task_name': task['task_name'],
+                    # Date for display, in the app timezone whatever offset it came with
+                    'date': to_datetime(parse_minutes(task['start'])).strftime("%A, %B %d"),
+                    'status': task.get("status", "on-time"),
+                    'reasoning': task.get("reasoning", ""),
+                    'link': inserted['link'],
+                    'error': inserted['error']
+                })
+
+            # Step 4: Result for chat.html, which renders (and escapes) it; the summary,
+            # insights and task names are model output and may contain anything
+            result = {
+                'optimization_summary': optimization_summary,
+                'schedule_insights': schedule_insights,
+                'tasks': tasks,
+                'late_tasks': [t for t in scheduled_tasks if t.get("status") == "late"],
+                'skipped_tasks': skipped_tasks
+            }
 
         except Exception as e:
-            result_html = f"<h3>Error:</h3><pre>{str(e)}</pre>"
-
-    return render_template('chat.html', result=result_html)
+            result = {'error': str(e)}
+
+    return render_template('chat.html', result=result)
+
+
+# Queues a scheduling request as a background job and returns its ID immediately
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    pipeline = request.form.get('pipeline', DEFAULT_PIPELINE)
+    if pipeline not in PIPELINES:
+        pipeline = DEFAULT_PIPELINE
+
+    try:
+        job_id = submit_scheduling_job(
+            session['user'],
+            request.form['task_input'],
+            request.form.get('priority', 'medium'),
+            pipeline
+        )
+    except TooManyJobsError as e:
+        return jsonify({'error': str(e)}), 429
+
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'stream_url': url_for('job_stream', job_id=job_id)
+    }), 202
+
+# Poll endpoint: job status, current stage and the results gathered so far
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    job = get_job(job_id, session['user'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+# Streams a job's progress to chat.html as server-sent events: each task is pushed as soon
+# as it is decided and again once it's in Google Calendar. The work itself is started by
+# POST /jobs, so this GET only reads and the task text never appears in a URL.
+# Long jobs are streamed in bounded pieces: the stream ends after JOB_STREAM_MAX_SECONDS,
+# the browser reconnects with Last-Event-ID and the stream resumes after that event.
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    user = session['user']
+    if get_job(job_id, user) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    try:
+        start = max(0, int(request.headers.get('Last-Event-ID', 0)))
+    except ValueError:
+        start = 0
+
+    def events():
+        for index, event, data in job_events(job_id, user, start):
+            if event == 'keepalive':
+                # An SSE comment: keeps proxies from timing out an idle connection
+                yield ": keepalive\n\n"
+            elif index is None:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield f"id: {index + 1}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# Prometheus scrape endpoint: stage latency histograms, API call/token/retry counters, parse cache stats
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
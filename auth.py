@@ -1,6 +1,7 @@
 """
 Google OAuth authentication handling module.
 """
+import hashlib
 import os
 from google_auth_oauthlib.flow import Flow
 from dotenv import load_dotenv
@@ -38,3 +39,13 @@ def credentials_to_dict(creds):
         'client_secret': creds.client_secret,
         'scopes': creds.scopes
     }
+
+def user_key_for(account_id):
+    """
+    Stable per-user key for the event store, credential store and job queue, derived from the
+    Google account's identity (its primary calendar ID, i.e. its email address). Tokens can't be
+    used: Google issues a new refresh token on every consent, which would make each login a new user.
+    """
+    if not account_id:
+        raise ValueError("Can't identify the Google account: no primary calendar ID")
+    return hashlib.sha256(account_id.strip().lower().encode()).hexdigest()[:16]
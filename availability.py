@@ -0,0 +1,128 @@
+"""
+Vectorized availability engine.
+
+Busy time for each calendar is kept as a minute-resolution occupancy array over the whole
+horizon (one row per calendar, one column per minute), so free windows, intersections
+across calendars or attendees, buffers around busy time and "all gaps of at least N
+minutes" are a handful of NumPy array operations instead of Python loops over intervals.
+All times in and out are epoch minutes (see models).
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from models import TIMEZONE, Slot, to_minutes
+
+WORK_START_HOUR = 8
+WORK_END_HOUR = 19
+
+class OccupancyGrid:
+    """
+    Occupancy of several calendars over num_days local days starting on start_date's date.
+    Column 0 is local midnight of the first day; days are located by their real local
+    midnights, so a DST change inside the horizon doesn't shift later days.
+    """
+
+    def __init__(self, start_date, num_days, calendars=('primary',), tz=TIMEZONE):
+        self.tz = tz
+        self.calendars = list(calendars)
+        self.rows = {calendar: i for i, calendar in enumerate(self.calendars)}
+
+        first_day = start_date.date() if isinstance(start_date, datetime) else start_date
+        self.dates = [first_day + timedelta(days=i) for i in range(num_days + 1)]
+        midnights = [to_minutes(datetime(day.year, day.month, day.day), tz) for day in self.dates]
+        self.origin = midnights[0]
+        # Column where each day starts; the extra last entry is the end of the horizon
+        self.day_starts = np.array(midnights, dtype=np.int64) - self.origin
+        self.dates = self.dates[:-1]
+
+        self.minutes = int(self.day_starts[-1])
+        # +1 where a busy interval starts, -1 where it ends; a running sum > 0 means covered.
+        # Summing rows first gives the number of calendars busy at each minute with a single
+        # running sum, however many calendars are combined.
+        self.delta = np.zeros((len(self.calendars), self.minutes + 1), dtype=np.int32)
+
+    @property
+    def occupancy(self):
+        """(calendars x minutes) boolean array, True where that calendar is busy."""
+        return np.cumsum(self.delta[:, :-1], axis=1) > 0
+
+    def add_busy(self, calendar, intervals):
+        """Marks (start, end) epoch-minute intervals as busy on one calendar; parts outside the horizon are dropped."""
+        if not len(intervals):
+            return
+        bounds = np.clip(np.asarray(intervals, dtype=np.int64).reshape(-1, 2) - self.origin, 0, self.minutes)
+        bounds = bounds[bounds[:, 0] < bounds[:, 1]]
+
+        row = self.delta[self.rows[calendar]]
+        row += np.bincount(bounds[:, 0], minlength=self.minutes + 1).astype(np.int32)
+        row -= np.bincount(bounds[:, 1], minlength=self.minutes + 1).astype(np.int32)
+
+    def busy(self, calendars=None, buffer_minutes=0):
+        """
+        Minutes where any of the calendars (all by default) is busy, i.e. where not all of
+        them are free, with every busy block widened by buffer_minutes on both sides.
+        """
+        rows = self.delta if calendars is None else self.delta[[self.rows[c] for c in calendars]]
+        busy = np.cumsum(rows[:, :-1].sum(axis=0)) > 0
+        return dilate(busy, buffer_minutes, buffer_minutes) if buffer_minutes else busy
+
+    def window(self, start_hour=WORK_START_HOUR, end_hour=WORK_END_HOUR):
+        """Minutes between start_hour and end_hour local time on each day of the horizon."""
+        delta = np.zeros(self.minutes + 1, dtype=np.int32)
+        for day in self.dates:
+            delta[self._column(day, start_hour)] += 1
+            delta[self._column(day, end_hour)] -= 1
+        return np.cumsum(delta[:-1]) > 0
+
+    def free(self, calendars=None, buffer_minutes=0, start_hour=WORK_START_HOUR, end_hour=WORK_END_HOUR):
+        """Minutes inside the daily window where every one of the calendars is free."""
+        return self.window(start_hour, end_hour) & ~self.busy(calendars, buffer_minutes)
+
+    def gaps(self, min_minutes=1, calendars=None, buffer_minutes=0, start_hour=WORK_START_HOUR, end_hour=WORK_END_HOUR):
+        """All free windows of at least min_minutes (see free()), as Slots in time order."""
+        starts, ends = self._runs(self.free(calendars, buffer_minutes, start_hour, end_hour), min_minutes)
+        return [Slot(int(start), int(end), self.tz) for start, end in zip(starts + self.origin, ends + self.origin)]
+
+    def free_slots_by_day(self, min_minutes=1, calendars=None, buffer_minutes=0, start_hour=WORK_START_HOUR, end_hour=WORK_END_HOUR):
+        """Free windows in the {date: [{'start', 'end'}]} shape used by calendar_api, with an entry for every day."""
+        starts, ends = self._runs(self.free(calendars, buffer_minutes, start_hour, end_hour), min_minutes)
+        days = np.searchsorted(self.day_starts, starts, side='right') - 1
+
+        all_slots = {day.strftime("%Y-%m-%d"): [] for day in self.dates}
+        for day, start, end in zip(days, starts + self.origin, ends + self.origin):
+            all_slots[self.dates[day].strftime("%Y-%m-%d")].append(Slot(int(start), int(end), self.tz).to_dict())
+        return all_slots
+
+    def _column(self, day, hour):
+        column = to_minutes(datetime(day.year, day.month, day.day) + timedelta(hours=hour), self.tz) - self.origin
+        return min(max(column, 0), self.minutes)
+
+    @staticmethod
+    def _runs(mask, min_minutes):
+        """Column (starts, ends) of the runs of True in mask that are at least min_minutes long."""
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+        starts, ends = edges[0::2], edges[1::2]
+        keep = ends - starts >= min_minutes
+        return starts[keep], ends[keep]
+
+def dilate(mask, before, after):
+    """Widens every run of True in mask by `before` minutes at its start and `after` minutes at its end."""
+    covered = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    columns = np.arange(len(mask))
+    # Column t is covered if any set minute lies in [t - after, t + before]
+    lo = np.clip(columns - after, 0, len(mask))
+    hi = np.clip(columns + before + 1, 0, len(mask))
+    return covered[hi] - covered[lo] > 0
+
+def find_common_free_time(busy_by_calendar, start_date, num_days, min_minutes, buffer_minutes=0,
+                          start_hour=WORK_START_HOUR, end_hour=WORK_END_HOUR, tz=TIMEZONE):
+    """
+    Team scheduling: every window of at least min_minutes inside the daily working hours
+    where all of the calendars ({calendar: [(start, end) epoch minutes]}) are free, keeping
+    buffer_minutes clear around everyone's busy time. Returns Slots in time order.
+    """
+    grid = OccupancyGrid(start_date, num_days, list(busy_by_calendar), tz)
+    for calendar, intervals in busy_by_calendar.items():
+        grid.add_busy(calendar, intervals)
+    return grid.gaps(min_minutes, buffer_minutes=buffer_minutes, start_hour=start_hour, end_hour=end_hour)
@@ -0,0 +1,221 @@
+"""
+Headless batch runner for scheduling requests.
+
+Reads a JSONL file with one scheduling request per line:
+    {"id": "r1", "user": "alice", "input": "Gym at 7pm today, report before Friday", "priority": "medium"}
+runs each through the same pipeline as the web app and appends one result line per request
+to an output JSONL file as soon as it finishes. Re-running with the same output file resumes:
+requests that already have a result are skipped. Inserted events get IDs derived from the
+request ID, so a request that is run again (after a crash, or with --retry-failed) finds the
+events it already inserted instead of adding them twice.
+
+Credentials come from the request's "credentials" object if present, otherwise from
+<credentials-dir>/<user>.json (see auth.credentials_to_dict). They seed credential_store the
+first time a user is seen; after that the store's (refreshed) token is used.
+
+Usage:
+    python batch.py requests.jsonl --output results.jsonl --concurrency 8
+    python batch.py requests.jsonl --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from calendar_api import primary_calendar_id
+import credential_store
+from pipeline import stream_scheduling_pipeline
+
+PIPELINES = ('agentic', 'fused', 'local')
+
+_accounts = {}  # refresh token -> primary calendar ID, so each credentials file is looked up once per run
+_accounts_lock = threading.Lock()
+
+def load_requests(path):
+    """Yields (request_id, request) for each non-empty line; ids default to the line number."""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"line-{line_number}", {'error': f"Invalid JSON: {e}"}
+                continue
+            yield str(request.get('id') or f"line-{line_number}"), request
+
+def load_finished_ids(output_path, retry_failed):
+    """IDs that already have a result in the output file; a line cut off by a crash is ignored."""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, errors='replace') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            if record.get('status') == 'done' or not retry_failed:
+                finished.add(record.get('id'))
+    return finished
+
+def load_credentials(request, credentials_dir):
+    if request.get('credentials'):
+        return dict(request['credentials'])
+    user = request.get('user')
+    if not user:
+        raise ValueError("Request has neither 'credentials' nor 'user'")
+    path = os.path.join(credentials_dir, f"{os.path.basename(user)}.json")
+    if not os.path.exists(path):
+        raise ValueError(f"No credentials for user '{user}' (expected {path})")
+    with open(path) as f:
+        return json.load(f)
+
+def account_for(creds_dict):
+    """The account (primary calendar ID) the credentials belong to, which keys the user's stores."""
+    token = creds_dict.get('refresh_token') or creds_dict.get('token')
+    with _accounts_lock:
+        account = _accounts.get(token)
+    if account is None:
+        account = primary_calendar_id(creds_dict)
+        with _accounts_lock:
+            _accounts[token] = account
+    return account
+
+def run_request(request_id, request, pipeline, dry_run, credentials_dir):
+    """Runs one request through the scheduling pipeline and returns its result record."""
+    record = {
+        'id': request_id,
+        'user': request.get('user'),
+        'status': 'failed',
+        'dry_run': dry_run,
+        'scheduled_tasks': [],
+        'inserted': [],
+        'skipped_tasks': [],
+        'optimization_summary': "",
+        'schedule_insights': [],
+        'error': None,
+    }
+    start = time.perf_counter()
+
+    try:
+        if request.get('error'):
+            raise ValueError(request['error'])
+        user_input = request.get('input') or request.get('task_input')
+        if not user_input:
+            raise ValueError("Request has no 'input' text")
+        request_pipeline = request.get('pipeline', pipeline)
+        if request_pipeline not in PIPELINES:
+            raise ValueError(f"Unknown pipeline '{request_pipeline}'")
+
+        creds_dict = load_credentials(request, credentials_dir)
+        user_key = credential_store.register_credentials(creds_dict, account_for(creds_dict))
+        events = stream_scheduling_pipeline(
+            user_key, user_input, request.get('priority', 'medium'), request_pipeline,
+            insert=not dry_run, event_key=request_id
+        )
+        for event, data in events:
+            if event == 'task':
+                record['scheduled_tasks'].append(data)
+            elif event == 'inserted':
+                record['inserted'].append(data)
+            elif event == 'skipped':
+                record['skipped_tasks'].append(data)
+            elif event == 'summary':
+                record.update(data)
+        record['status'] = 'done'
+    except Exception as e:
+        print(f"DEBUG: Batch request {request_id} failed: {e}", file=sys.stderr)
+        record['error'] = str(e)
+
+    record['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    record['finished_at'] = time.time()
+    return record
+
+class ResultWriter:
+    """Appends result records to the output file, one complete line at a time, from many threads."""
+
+    def __init__(self, path):
+        # A crash mid-write can leave a partial last line; end it so the next record starts
+        # on a line of its own instead of being glued onto the fragment
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                ends_with_newline = f.read(1) == b"\n"
+            if not ends_with_newline:
+                with open(path, 'a') as f:
+                    f.write("\n")
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+        self.counts = {'done': 0, 'failed': 0}
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            # Durable before we move on, so a crash never loses a finished request
+            os.fsync(self.file.fileno())
+            self.counts[record['status']] += 1
+
+    def close(self):
+        self.file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="JSONL file of scheduling requests")
+    parser.add_argument('--output', help="JSONL file for results (default: <input>.results.jsonl)")
+    parser.add_argument('--concurrency', type=int, default=4, help="users processed in parallel")
+    parser.add_argument('--pipeline', choices=PIPELINES, default=os.getenv('SCHEDULING_PIPELINE', 'agentic'),
+                        help="scheduling pipeline for requests that don't name one")
+    parser.add_argument('--dry-run', action='store_true', help="schedule but don't insert anything into the calendars")
+    parser.add_argument('--credentials-dir', default=os.getenv('BATCH_CREDENTIALS_DIR', 'credentials'),
+                        help="directory of <user>.json credential files")
+    parser.add_argument('--retry-failed', action='store_true', help="when resuming, run failed requests again")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    finished = load_finished_ids(output, args.retry_failed)
+
+    # One user's requests run in order, so a later request sees the events an earlier one
+    # inserted; different users run in parallel
+    by_user = {}
+    skipped = 0
+    for request_id, request in load_requests(args.input):
+        if request_id in finished:
+            skipped += 1
+            continue
+        by_user.setdefault(request.get('user') or request_id, []).append((request_id, request))
+
+    pending = sum(len(requests) for requests in by_user.values())
+    print(f"{pending} request(s) to run for {len(by_user)} user(s), {skipped} already finished in {output}")
+
+    writer = ResultWriter(output)
+
+    def run_user(requests):
+        for request_id, request in requests:
+            writer.write(run_request(request_id, request, args.pipeline, args.dry_run, args.credentials_dir))
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch-user") as pool:
+            for future in [pool.submit(run_user, requests) for requests in by_user.values()]:
+                future.result()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Finished in {elapsed:.1f}s: {writer.counts['done']} done, {writer.counts['failed']} failed -> {output}")
+    return 1 if writer.counts['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,516 @@
+"""
+Offline benchmark for the scheduling pipeline.
+
+Starts local stand-ins for Google Calendar (calendar list, freebusy, events list/insert, batch) and the
+OpenAI chat-completions API, with configurable latency and payload sizes, points the app
+at them and reports per-stage timings, API call counts and /chat throughput for a range of
+horizon lengths and task counts. Needs no Google or OpenAI account and no network.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --horizons 1,7,14 --tasks 1,10 --calendar-latency-ms 80 --llm-latency-ms 1500
+    python benchmark.py --pipelines local --requests 50 --concurrency 8 --json bench.json
+"""
+import argparse
+import email
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+# Inputs whose keywords make analyze_user_input_for_date_range pick each horizon
+HORIZON_KEYWORDS = {1: "today", 2: "tomorrow", 3: "", 7: "this week", 14: "next week"}
+
+FAKE_CREDENTIALS = {
+    'token': 'benchmark-token',
+    'refresh_token': 'benchmark-refresh-token',
+    'token_uri': 'http://127.0.0.1/token',
+    'client_id': 'benchmark',
+    'client_secret': 'benchmark',
+    'scopes': ['https://www.googleapis.com/auth/calendar']
+}
+FAKE_ACCOUNT = 'bench@example.com'
+
+api_calls = Counter()
+_api_calls_lock = threading.Lock()
+
+def count_call(name, amount=1):
+    with _api_calls_lock:
+        api_calls[name] += amount
+
+def snapshot_calls():
+    with _api_calls_lock:
+        return Counter(api_calls)
+
+class BenchmarkConfig:
+    """Knobs shared by the fake servers; task_count changes per scenario."""
+
+    def __init__(self, args):
+        self.calendar_latency = args.calendar_latency_ms / 1000
+        self.llm_latency = args.llm_latency_ms / 1000
+        self.llm_padding = args.llm_padding
+        self.events_per_day = args.events_per_day
+        self.task_count = 1
+
+# ---------------------------------------------------------------------------
+# Fake Google Calendar
+# ---------------------------------------------------------------------------
+
+class FakeCalendar:
+    """In-memory calendar with a few meetings per day plus whatever the app inserts."""
+
+    def __init__(self, events_per_day):
+        self.lock = threading.Lock()
+        self.events = []
+        self.changes = []  # inserted events, in order; sync tokens are offsets into this list
+
+        today = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+        for day in range(-2, 45):
+            for i in range(events_per_day):
+                start = today + timedelta(days=day, hours=9 + i * 1.5)
+                self.events.append(self._event(f"Meeting {day}-{i}", start, start + timedelta(minutes=45)))
+
+    def _event(self, summary, start, end):
+        event_id = uuid.uuid4().hex
+        return {
+            'id': event_id,
+            'status': 'confirmed',
+            'summary': summary,
+            'htmlLink': f"https://calendar.example/event?eid={event_id}",
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': end.isoformat()},
+        }
+
+    def between(self, time_min, time_max):
+        with self.lock:
+            return sorted(
+                (e for e in self.events
+                 if datetime.fromisoformat(e['start']['dateTime']) < time_max
+                 and datetime.fromisoformat(e['end']['dateTime']) > time_min),
+                key=lambda e: e['start']['dateTime']
+            )
+
+    def insert(self, body):
+        event = self._event(
+            body.get('summary', 'Untitled'),
+            datetime.fromisoformat(body['start']['dateTime']),
+            datetime.fromisoformat(body['end']['dateTime'])
+        )
+        with self.lock:
+            self.events.append(event)
+            self.changes.append(event)
+        return event
+
+def _parse_time(value, default):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else default
+
+def make_calendar_handler(config, calendar):
+    class CalendarHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload, content_type='application/json'):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        def do_GET(self):
+            time.sleep(config.calendar_latency)
+            url = urlparse(self.path)
+            if url.path.endswith('/events'):
+                self._send(200, self._list_events(parse_qs(url.query)))
+            elif url.path.endswith('/calendarList'):
+                count_call('calendar.calendarList.list')
+                self._send(200, {'items': [{'id': FAKE_ACCOUNT, 'primary': True, 'selected': True, 'summary': 'Bench'}]})
+            elif url.path.endswith('/calendarList/primary'):
+                count_call('calendar.calendarList.get')
+                self._send(200, {'id': FAKE_ACCOUNT, 'primary': True, 'summary': 'Bench'})
+            else:
+                self._send(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        def do_POST(self):
+            time.sleep(config.calendar_latency)
+            url = urlparse(self.path)
+            body = self._body()
+            if url.path.endswith('/freeBusy'):
+                self._send(200, self._freebusy(json.loads(body)))
+            elif url.path.endswith('/events'):
+                count_call('calendar.events.insert')
+                self._send(200, calendar.insert(json.loads(body)))
+            elif url.path.startswith('/batch'):
+                payload, content_type = self._batch(body)
+                self._send(200, payload, content_type)
+            else:
+                self._send(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        def _freebusy(self, body):
+            count_call('calendar.freebusy')
+            time_min = _parse_time(body['timeMin'], None)
+            time_max = _parse_time(body['timeMax'], None)
+            busy = [{'start': e['start']['dateTime'], 'end': e['end']['dateTime']} for e in calendar.between(time_min, time_max)]
+            return {'calendars': {item['id']: {'busy': busy} for item in body.get('items', [])}}
+
+        def _list_events(self, query):
+            count_call('calendar.events.list')
+            arg = lambda name: query.get(name, [None])[0]
+            page_size = int(arg('maxResults') or 250)
+            offset = int(arg('pageToken') or 0)
+
+            sync_token = arg('syncToken')
+            if sync_token:
+                with calendar.lock:
+                    items = list(calendar.changes[int(sync_token.split('-')[1]):])
+            else:
+                far = datetime.now(IST) + timedelta(days=3650)
+                items = calendar.between(_parse_time(arg('timeMin'), far - timedelta(days=7300)), _parse_time(arg('timeMax'), far))
+
+            page = items[offset:offset + page_size]
+            result = {'items': page}
+            if offset + page_size < len(items):
+                result['nextPageToken'] = str(offset + page_size)
+            elif not arg('timeMax') or sync_token:
+                with calendar.lock:
+                    result['nextSyncToken'] = f"sync-{len(calendar.changes)}"
+            return result
+
+        def _batch(self, body):
+            count_call('calendar.batch')
+            message = email.message_from_bytes(
+                b"Content-Type: " + self.headers['Content-Type'].encode() + b"\r\n\r\n" + body
+            )
+            boundary = uuid.uuid4().hex
+            parts = []
+
+            for part in message.get_payload():
+                count_call('calendar.batch.parts')
+                content_id = part['Content-ID'].strip('<>')
+                http_request = part.get_payload()
+                if isinstance(http_request, list):
+                    http_request = http_request[0].as_string()
+                request_body = http_request.replace('\r\n', '\n').split('\n\n', 1)[1]
+                event = calendar.insert(json.loads(request_body))
+                parts.append(
+                    f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                    f"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(event)}\r\n"
+                )
+
+            payload = ("".join(parts) + f"--{boundary}--\r\n").encode()
+            return payload, f"multipart/mixed; boundary={boundary}"
+
+    return CalendarHandler
+
+# ---------------------------------------------------------------------------
+# Fake OpenAI chat completions
+# ---------------------------------------------------------------------------
+
+def _fake_parse_response(config):
+    day = (datetime.now(IST) + timedelta(days=1)).strftime("%Y-%m-%d")
+    return json.dumps([
+        {
+            'task_name': f"Benchmark task {i}",
+            'duration': 45,
+            'deadline': f"{day}T18:00:00+05:30",
+            'priority': ['high', 'medium', 'low'][i % 3],
+            'fixed': False,
+            'date': day
+        }
+        for i in range(config.task_count)
+    ])
+
+def _fake_schedule_response(config, summary_key):
+    start = (datetime.now(IST) + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+    tasks = []
+    for i in range(config.task_count):
+        task_start = start + timedelta(minutes=50 * i)
+        tasks.append({
+            'task_name': f"Benchmark task {i}",
+            'start': task_start.strftime("%Y-%m-%dT%H:%M"),
+            'end': (task_start + timedelta(minutes=45)).strftime("%Y-%m-%dT%H:%M"),
+            'status': 'on-time',
+            'priority': 'medium',
+            'reasoning': "Placed in the earliest free slot"
+        })
+    return json.dumps({
+        'scheduled_tasks': tasks,
+        'skipped_tasks': [],
+        summary_key: "Benchmark schedule " + "x" * config.llm_padding,
+        'schedule_insights': ["Synthetic response"]
+    })
+
+def make_openai_handler(config):
+    class OpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+            count_call('openai.chat')
+
+            system = request['messages'][0]['content']
+            if "convert task descriptions" in system:
+                content = _fake_parse_response(config)
+            elif "agentic" in system:
+                content = _fake_schedule_response(config, 'optimization_summary')
+            else:
+                content = _fake_schedule_response(config, 'reasoning_logs')
+
+            prompt_tokens = sum(len(m['content']) for m in request['messages']) // 4
+            usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4,
+                     'total_tokens': prompt_tokens + len(content) // 4}
+            count_call('openai.prompt_tokens', prompt_tokens)
+
+            if request.get('stream'):
+                self._stream(request, content, usage)
+            else:
+                time.sleep(config.llm_latency)
+                body = json.dumps({
+                    'id': 'chatcmpl-benchmark', 'object': 'chat.completion', 'created': int(time.time()),
+                    'model': request['model'],
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': usage
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def _stream(self, request, content, usage):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            # Spread the configured latency over the chunks, like token-by-token generation
+            chunk_count = 20
+            size = max(1, len(content) // chunk_count + 1)
+            chunks = [content[i:i + size] for i in range(0, len(content), size)]
+
+            def send(payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            base = {'id': 'chatcmpl-benchmark', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': request['model']}
+            for chunk in chunks:
+                time.sleep(config.llm_latency / len(chunks))
+                send(dict(base, choices=[{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}]))
+            send(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+            if (request.get('stream_options') or {}).get('include_usage'):
+                send(dict(base, choices=[], usage=usage))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return OpenAIHandler
+
+def start_server(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def measure(name, fn, repeat):
+    """Runs fn repeat times; returns a row with median/p90 latency and API calls per run."""
+    before = snapshot_calls()
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    calls = snapshot_calls() - before
+
+    row = {
+        'stage': name,
+        'median_ms': percentile(timings, 0.5),
+        'p90_ms': percentile(timings, 0.9),
+        'calendar_calls': sum(v for k, v in calls.items() if k.startswith('calendar.') and k != 'calendar.batch.parts') / repeat,
+        'llm_calls': calls['openai.chat'] / repeat,
+        'prompt_tokens': calls['openai.prompt_tokens'] / repeat,
+    }
+    return row, result
+
+def unique_input(horizon, task_count):
+    # A fresh suffix each time keeps the parse cache from hiding the GPT call
+    return f"Benchmark {task_count} tasks {HORIZON_KEYWORDS[horizon]} run {uuid.uuid4().hex[:8]}"
+
+def run_stage_benchmarks(config, horizon, task_count, repeat):
+    import calendar_api
+    import credential_store
+    import gpt_parser
+    import scheduler
+
+    config.task_count = task_count
+    user = credential_store.register_credentials(FAKE_CREDENTIALS, FAKE_ACCOUNT)
+    start_date = datetime.now()
+    rows = []
+
+    row, _ = measure("freebusy (get_free_slots_multi_day)", lambda: calendar_api.get_free_slots_multi_day(user, start_date, horizon), repeat)
+    rows.append(row)
+    row, _ = measure("events (get_existing_events_for_ai)", lambda: calendar_api.get_existing_events_for_ai(user, start_date, horizon), repeat)
+    rows.append(row)
+    row, (slots, events) = measure("availability (get_availability)", lambda: calendar_api.get_availability(user, start_date, horizon), repeat)
+    rows.append(row)
+
+    row, parsed = measure("gpt parse", lambda: gpt_parser.parse_tasks_with_gpt(unique_input(horizon, task_count), 'medium'), repeat)
+    rows.append(row)
+    row, agentic = measure("agentic schedule", lambda: gpt_parser.agentic_batch_schedule(parsed, 'medium', slots, events), repeat)
+    rows.append(row)
+    row, _ = measure("fused schedule", lambda: gpt_parser.ai_schedule_tasks(unique_input(horizon, task_count), 'medium', slots, events), repeat)
+    rows.append(row)
+    row, _ = measure("local schedule", lambda: scheduler.local_batch_schedule(parsed, 'medium', slots, events), repeat)
+    rows.append(row)
+    row, validated = measure("validate + repair", lambda: scheduler.validate_and_repair_schedule(agentic[0], slots, events, parsed), repeat)
+    rows.append(row)
+    row, _ = measure("batch insert (insert_events)", lambda: calendar_api.insert_events(user, validated[0]), repeat)
+    rows.append(row)
+
+    return rows
+
+def _chat_client(app):
+    client = app.test_client()
+    import credential_store
+
+    with client.session_transaction() as session:
+        session['user'] = credential_store.register_credentials(FAKE_CREDENTIALS, FAKE_ACCOUNT)
+    return client
+
+def _post_chat(client, horizon, task_count, pipeline):
+    response = client.post('/chat', data={
+        'task_input': unique_input(horizon, task_count),
+        'priority': 'medium',
+        'pipeline': pipeline
+    })
+    if response.status_code != 200 or b"<h3>Error:</h3>" in response.data:
+        raise RuntimeError(f"/chat failed ({response.status_code}): {response.data[:300]!r}")
+
+def run_chat_benchmarks(config, horizon, task_count, pipelines, repeat, requests, concurrency):
+    from app import app
+
+    config.task_count = task_count
+    rows = []
+    client = _chat_client(app)
+
+    for pipeline in pipelines:
+        row, _ = measure(f"/chat end-to-end ({pipeline})", lambda: _post_chat(client, horizon, task_count, pipeline), repeat)
+
+        # Throughput: `requests` POSTs from `concurrency` clients at once
+        clients = [_chat_client(app) for _ in range(concurrency)]
+        errors = []
+
+        def worker(i):
+            try:
+                _post_chat(clients[i % concurrency], horizon, task_count, pipeline)
+            except Exception as e:
+                errors.append(e)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(requests)))
+        elapsed = time.perf_counter() - start
+
+        row['throughput_rps'] = (requests - len(errors)) / elapsed
+        row['errors'] = len(errors)
+        rows.append(row)
+
+    return rows
+
+def print_rows(title, rows):
+    print(f"\n{title}")
+    print(f"  {'stage':<40} {'median ms':>10} {'p90 ms':>10} {'cal calls':>10} {'llm calls':>10} {'prompt tok':>11} {'req/s':>8}")
+    for row in rows:
+        throughput = f"{row['throughput_rps']:.2f}" if 'throughput_rps' in row else ""
+        print(
+            f"  {row['stage']:<40} {row['median_ms']:>10.1f} {row['p90_ms']:>10.1f} {row['calendar_calls']:>10.1f} "
+            f"{row['llm_calls']:>10.1f} {row['prompt_tokens']:>11.0f} {throughput:>8}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--horizons', default="1,3,7,14", help="comma-separated horizon lengths in days (1, 2, 3, 7 or 14)")
+    parser.add_argument('--tasks', default="1,5,10", help="comma-separated task counts per request")
+    parser.add_argument('--pipelines', default="agentic,fused,local", help="/chat pipelines to drive end-to-end")
+    parser.add_argument('--calendar-latency-ms', type=float, default=50, help="added latency per fake Calendar request")
+    parser.add_argument('--llm-latency-ms', type=float, default=500, help="added latency per fake chat completion")
+    parser.add_argument('--llm-padding', type=int, default=500, help="extra characters in each schedule response")
+    parser.add_argument('--events-per-day', type=int, default=4, help="existing meetings per day in the fake calendar")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measured stage")
+    parser.add_argument('--requests', type=int, default=12, help="/chat requests per throughput run")
+    parser.add_argument('--concurrency', type=int, default=4, help="concurrent clients per throughput run")
+    parser.add_argument('--quick-parse', action='store_true', help="let the rule-based parser skip GPT when it can")
+    parser.add_argument('--no-event-store', action='store_true', help="list events from the API instead of the synced store")
+    parser.add_argument('--json', help="also write all result rows to this JSON file")
+    args = parser.parse_args()
+
+    horizons = [int(h) for h in args.horizons.split(',')]
+    unsupported = [h for h in horizons if h not in HORIZON_KEYWORDS]
+    if unsupported:
+        parser.error(f"unsupported horizons {unsupported}; choose from {sorted(HORIZON_KEYWORDS)}")
+    task_counts = [int(t) for t in args.tasks.split(',')]
+    pipelines = args.pipelines.split(',')
+
+    config = BenchmarkConfig(args)
+    calendar = FakeCalendar(args.events_per_day)
+    calendar_server, calendar_url = start_server(make_calendar_handler(config, calendar))
+    openai_server, openai_url = start_server(make_openai_handler(config))
+
+    # The app reads these at import time, so set them before importing any app module
+    store_dir = tempfile.mkdtemp(prefix="scheduler-bench-")
+    os.environ.update({
+        'CALENDAR_API_ROOT_URL': calendar_url,
+        'OPENAI_BASE_URL': openai_url + "v1",
+        'OPENAI_API_KEY': "benchmark",
+        'EVENT_STORE_PATH': os.path.join(store_dir, "events.sqlite3"),
+        'CREDENTIAL_STORE_PATH': os.path.join(store_dir, "credentials.sqlite3"),
+        'USE_EVENT_STORE': "0" if args.no_event_store else "1",
+        'QUICK_PARSE_MIN_CONFIDENCE': "0.8" if args.quick_parse else "2",
+    })
+
+    results = []
+    for horizon in horizons:
+        for task_count in task_counts:
+            rows = run_stage_benchmarks(config, horizon, task_count, args.repeat)
+            rows += run_chat_benchmarks(config, horizon, task_count, pipelines, args.repeat, args.requests, args.concurrency)
+            print_rows(f"horizon={horizon}d tasks={task_count}", rows)
+            for row in rows:
+                results.append(dict(row, horizon=horizon, tasks=task_count))
+
+    print(f"\nTotal API calls: {dict(snapshot_calls())}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {len(results)} rows to {args.json}")
+
+    calendar_server.shutdown()
+    openai_server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,117 @@
 """
 Google Calendar API integration module.
 """
-from googleapiclient.discovery import build
+from cachetools import TTLCache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
 import google.oauth2.credentials
+import google_auth_httplib2
+import httplib2
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-import pytz
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
 import re
 
+from availability import OccupancyGrid
+import credential_store
+import event_store
+from models import TIMEZONE, Event, Slot, to_datetime, to_minutes
+import metrics
+import outbound
+
+# Pool of idle Calendar service objects, reused across calls and requests so the
+# discovery document is parsed once and HTTP connections stay open.
+SERVICE_POOL_MAX_SIZE = int(os.getenv("CALENDAR_SERVICE_POOL_SIZE", "32"))
+SERVICE_POOL_IDLE_SECONDS = int(os.getenv("CALENDAR_SERVICE_IDLE_SECONDS", "300"))
+
+# Answer availability from the local event store, kept current with incremental sync,
+# instead of re-listing the whole horizon from Google on every request
+USE_EVENT_STORE = os.getenv("USE_EVENT_STORE", "1") == "1"
+# How far back the first full sync reaches; later syncs only fetch changes
+EVENT_SYNC_LOOKBACK_DAYS = int(os.getenv("EVENT_SYNC_LOOKBACK_DAYS", "1"))
+# Sends Calendar API calls to another server, e.g. the fake Calendar in benchmark.py
+CALENDAR_API_ROOT_URL = os.getenv("CALENDAR_API_ROOT_URL")
+# Calendars whose busy time counts for availability: "auto" discovers them from the user's
+# calendar list (primary plus every selected calendar), otherwise a comma-separated list of IDs
+AVAILABILITY_CALENDARS = os.getenv("AVAILABILITY_CALENDARS", "auto")
+CALENDAR_LIST_TTL_SECONDS = int(os.getenv("CALENDAR_LIST_TTL_SECONDS", "3600"))
+# A freebusy query accepts at most 50 calendars
+FREEBUSY_MAX_CALENDARS = 50
+# Runs get_availability's freebusy query for the other calendars alongside its events load.
+# Separate from the pipeline's stage pool: get_availability runs as one of those stages, and
+# waiting on that bounded pool from inside it could deadlock.
+FREEBUSY_WORKERS = int(os.getenv("CALENDAR_FREEBUSY_WORKERS", "8"))
+freebusy_executor = ThreadPoolExecutor(max_workers=FREEBUSY_WORKERS, thread_name_prefix="freebusy")
+
+_calendar_lists = TTLCache(maxsize=1024, ttl=CALENDAR_LIST_TTL_SECONDS)  # user -> {calendar_id: name}
+_calendar_lists_lock = threading.Lock()
+
+_calendar_discovery_doc = None
+_idle_services = []  # (user_key, service, last_used), oldest first
+_service_pool_lock = threading.Lock()
+
+def _build_calendar_service(creds):
+    global _calendar_discovery_doc
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+
+    if _calendar_discovery_doc is None:
+        doc = get_static_doc('calendar', 'v3')
+        if doc is None:
+            client_options = {'api_endpoint': CALENDAR_API_ROOT_URL} if CALENDAR_API_ROOT_URL else None
+            return build('calendar', 'v3', http=http, client_options=client_options)
+        doc = json.loads(doc)
+        if CALENDAR_API_ROOT_URL:
+            # rootUrl also drives the batch endpoint, which api_endpoint alone doesn't move
+            doc['rootUrl'] = doc['mtlsRootUrl'] = CALENDAR_API_ROOT_URL
+            doc['baseUrl'] = CALENDAR_API_ROOT_URL + doc['servicePath']
+        _calendar_discovery_doc = doc
+
+    return build_from_document(_calendar_discovery_doc, http=http)
+
+def _evict_idle_services(now):
+    # Entries are kept in check-in order, so expired ones are always at the front
+    while _idle_services and (
+        now - _idle_services[0][2] > SERVICE_POOL_IDLE_SECONDS
+        or len(_idle_services) > SERVICE_POOL_MAX_SIZE
+    ):
+        _idle_services.pop(0)
+
+@contextmanager
+def calendar_service(user):
+    """
+    Checks out a Calendar service for this user from the pool (building one if none is idle)
+    and returns it afterwards. A service is only used by one caller at a time, since
+    httplib2 connections are not thread-safe. Services that raised are discarded.
+    All of a user's services share one Credentials object from credential_store, which is
+    refreshed here ahead of expiry rather than by the first request that hits a 401.
+    user is the user's key in credential_store, the one the session holds.
+    """
+    creds = credential_store.get_credentials(user)
+    service = None
+
+    with _service_pool_lock:
+        _evict_idle_services(time.monotonic())
+        for i in range(len(_idle_services) - 1, -1, -1):
+            if _idle_services[i][0] == user:
+                service = _idle_services.pop(i)[1]
+                break
+
+    if service is None:
+        service = _build_calendar_service(creds)
+
+    yield service
+
+    with _service_pool_lock:
+        _idle_services.append((user, service, time.monotonic()))
+        _evict_idle_services(time.monotonic())
+
 #Analyzes user input to determine the optimal date range for calendar API calls.
 def analyze_user_input_for_date_range(user_input):
 
@@ -59,7 +164,7 @@ def analyze_user_input_for_date_range(user_input):
     return today, 3
 
 #Gets free slots with optimized date range based on user input analysis.
-def get_optimized_free_slots(creds_dict, user_input=None, start_date=None, num_days=None):
+def get_optimized_free_slots(user, user_input=None, start_date=None, num_days=None):
     if start_date is None or num_days is None:
         if user_input:
             start_date, num_days = analyze_user_input_for_date_range(user_input)
@@ -70,153 +175,449 @@ def get_optimized_free_slots(creds_dict, user_input=None, start_date=None, num_d
             num_days = 3
             print(f"Using default: {num_days} day(s) starting from {start_date.strftime('%Y-%m-%d')}")
     
-    return get_free_slots_multi_day(creds_dict, start_date, num_days)
-
-def get_free_slots_for_date(creds_dict, target_date):
-    creds = google.oauth2.credentials.Credentials(**creds_dict)
-    service = build('calendar', 'v3', credentials=creds)
+    return get_free_slots_multi_day(user, start_date, num_days)
 
-    tz = pytz.timezone("Asia/Kolkata")
-    
+def get_free_slots_for_date(user, target_date):
     if target_date.tzinfo is None:
-        target_date = tz.localize(target_date)
+        target_date = TIMEZONE.localize(target_date)
     
     start_of_day = target_date.replace(hour=8, minute=0, second=0, microsecond=0)
     end_of_day = target_date.replace(hour=19, minute=0, second=0, microsecond=0)  # 7 PM
 
-    body = {
-        "timeMin": start_of_day.isoformat(),
-        "timeMax": end_of_day.isoformat(),
-        "timeZone": "Asia/Kolkata",
-        "items": [{"id": "primary"}]
-    }
+    with calendar_service(user) as service:
+        calendars = get_availability_calendars(user, service)
+        with metrics.span('freebusy'):
+            busy_by_calendar = query_busy(service, calendars, start_of_day, end_of_day)
+
+    return split_free_slots_by_day(busy_by_calendar, target_date, 1)[target_date.strftime("%Y-%m-%d")]
+
+def primary_calendar_id(creds):
+    """
+    ID of the account's primary calendar (its email address), which identifies the user
+    across logins (see auth.user_key_for). creds is a Credentials object or a credentials dict.
+    """
+    if isinstance(creds, dict):
+        creds = google.oauth2.credentials.Credentials(**creds)
+    service = _build_calendar_service(creds)
+    metrics.inc(metrics.API_CALLS, api='calendar', method='calendarList.get')
+    entry = outbound.calendar_provider.call(service.calendarList().get(calendarId='primary').execute)
+    return entry.get('id')
 
-    events_result = service.freebusy().query(body=body).execute()
-    busy_times = events_result['calendars']['primary']['busy']
+def list_availability_calendars(service):
+    """
+    Reads the user's calendar list (every page) and returns {calendar_id: name} for the
+    primary calendar, as 'primary', and every other selected calendar they can see busy time in.
+    """
+    calendars = {}
+    page_token = None
 
-    free_slots = []
-    current = start_of_day
+    while True:
+        metrics.inc(metrics.API_CALLS, api='calendar', method='calendarList.list')
+        result = outbound.calendar_provider.call(service.calendarList().list(
+            minAccessRole='freeBusyReader',
+            maxResults=250,
+            pageToken=page_token
+        ).execute)
 
-    for slot in busy_times:
-        busy_start = datetime.fromisoformat(slot['start'])
-        busy_end = datetime.fromisoformat(slot['end'])
+        for entry in result.get('items', []):
+            if entry.get('deleted'):
+                continue
+            if entry.get('primary'):
+                calendars['primary'] = entry.get('summary', 'primary')
+            elif entry.get('selected'):
+                calendars[entry['id']] = entry.get('summaryOverride') or entry.get('summary') or entry['id']
 
-        if current < busy_start:
-            free_slots.append({
-                'start': current.isoformat(),
-                'end': busy_start.isoformat()
-            })
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
 
-        current = max(current, busy_end)
+    calendars.setdefault('primary', 'primary')
+    return calendars
 
-    if current < end_of_day:
-        free_slots.append({
-            'start': current.isoformat(),
-            'end': end_of_day.isoformat()
-        })
+def get_availability_calendars(user, service):
+    """
+    The calendars whose busy time counts for this user, as {calendar_id: name}: the
+    AVAILABILITY_CALENDARS setting, or the user's calendar list, read once and then
+    cached for CALENDAR_LIST_TTL_SECONDS.
+    """
+    if AVAILABILITY_CALENDARS != 'auto':
+        ids = [calendar_id.strip() for calendar_id in AVAILABILITY_CALENDARS.split(',') if calendar_id.strip()]
+        return {calendar_id: calendar_id for calendar_id in ids or ['primary']}
 
-    return free_slots
+    with _calendar_lists_lock:
+        calendars = _calendar_lists.get(user)
+    if calendars is not None:
+        return calendars
 
-def get_free_slots_multi_day(creds_dict, start_date, num_days=7):
-    all_slots = {}
-    
-    for i in range(num_days):
-        current_date = start_date + timedelta(days=i)
-        date_str = current_date.strftime("%Y-%m-%d")
-        all_slots[date_str] = get_free_slots_for_date(creds_dict, current_date)
-    
-    return all_slots
+    try:
+        calendars = list_availability_calendars(service)
+    except HttpError as e:
+        # Not cached, so the next request tries the calendar list again
+        print(f"DEBUG: Could not read the calendar list ({e}); using the primary calendar only")
+        return {'primary': 'primary'}
 
-def get_existing_events_for_ai(creds_dict, start_date, num_days=7):
+    with _calendar_lists_lock:
+        _calendar_lists[user] = calendars
+    print(f"DEBUG: Availability calendars: {', '.join(calendars.values())}")
+    return calendars
+
+def query_busy(service, calendar_ids, time_min, time_max):
     """
-    Get existing calendar events formatted for AI scheduling context.
-    This helps the AI understand what's already scheduled to avoid conflicts.
+    Busy time of all the calendars over [time_min, time_max) from a single freebusy query
+    (one per FREEBUSY_MAX_CALENDARS calendars), as {calendar_id: [(start, end) epoch minutes]}.
+    Calendars freebusy reports an error for (e.g. no longer shared) are left out.
     """
-    creds = google.oauth2.credentials.Credentials(**creds_dict)
-    service = build('calendar', 'v3', credentials=creds)
-    
-    tz = pytz.timezone("Asia/Kolkata")
-    
+    calendar_ids = list(calendar_ids)
+    busy_by_calendar = {}
+
+    for offset in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+        body = {
+            "timeMin": time_min.isoformat(),
+            "timeMax": time_max.isoformat(),
+            "timeZone": TIMEZONE.zone,
+            "items": [{"id": calendar_id} for calendar_id in calendar_ids[offset:offset + FREEBUSY_MAX_CALENDARS]]
+        }
+        metrics.inc(metrics.API_CALLS, api='calendar', method='freebusy')
+        result = outbound.calendar_provider.call(service.freebusy().query(body=body).execute)
+
+        for calendar_id, calendar in result.get('calendars', {}).items():
+            if calendar.get('errors'):
+                print(f"DEBUG: freebusy skipped calendar {calendar_id}: {calendar['errors']}")
+                continue
+            busy_by_calendar[calendar_id] = parse_busy_times(calendar.get('busy', []))
+
+    return busy_by_calendar
+
+def parse_busy_times(busy_times):
+    """Parses a freebusy busy list ({'start', 'end'} ISO strings) once into sorted epoch-minute (start, end) pairs."""
+    return sorted((slot.start, slot.end) for slot in (Slot.from_dict(slot) for slot in busy_times))
+
+def get_free_slots_multi_day(user, start_date, num_days=7):
+    """
+    Fetches free slots for the whole horizon with a single freebusy query covering every
+    availability calendar, then merges their busy time and splits it locally into
+    per-day 8:00-19:00 windows.
+    """
+    if start_date.tzinfo is None:
+        start_date = TIMEZONE.localize(start_date)
+
+    first_day = start_date.replace(hour=8, minute=0, second=0, microsecond=0)
+    last_day = (start_date + timedelta(days=num_days - 1)).replace(hour=19, minute=0, second=0, microsecond=0)
+
+    with calendar_service(user) as service:
+        calendars = get_availability_calendars(user, service)
+        with metrics.span('freebusy'):
+            busy_by_calendar = query_busy(service, calendars, first_day, last_day)
+
+    return split_free_slots_by_day(busy_by_calendar, start_date, num_days)
+
+#Splits horizon-wide epoch-minute busy intervals ({calendar_id: [(start, end)]}) into per-day
+#8:00-19:00 free slots where every calendar is free, with the occupancy-array engine (see availability.py).
+def split_free_slots_by_day(busy_by_calendar, start_date, num_days):
+    grid = OccupancyGrid(start_date, num_days, list(busy_by_calendar))
+    for calendar_id, busy in busy_by_calendar.items():
+        grid.add_busy(calendar_id, busy)
+    return grid.free_slots_by_day()
+
+def _events_window(start_date, num_days):
     end_date = start_date + timedelta(days=num_days)
     
     if start_date.tzinfo is None:
-        start_date = tz.localize(start_date.replace(hour=0, minute=0, second=0))
+        start_date = TIMEZONE.localize(start_date.replace(hour=0, minute=0, second=0))
     if end_date.tzinfo is None:
-        end_date = tz.localize(end_date.replace(hour=23, minute=59, second=59))
-    
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=start_date.isoformat(),
-        timeMax=end_date.isoformat(),
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    
-    events = events_result.get('items', [])
-    
-    # Group events by date for AI context
+        end_date = TIMEZONE.localize(end_date.replace(hour=23, minute=59, second=59))
+
+    return start_date, end_date
+
+def list_events(service, time_min, time_max):
+    """Lists every event in [time_min, time_max), following nextPageToken until the last page."""
+    events = []
+    page_token = None
+
+    while True:
+        metrics.inc(metrics.API_CALLS, api='calendar', method='events.list')
+        events_result = outbound.calendar_provider.call(service.events().list(
+            calendarId='primary',
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=True,
+            orderBy='startTime',
+            maxResults=2500,
+            pageToken=page_token
+        ).execute)
+
+        events.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return events
+
+def parse_events(events):
+    """Parses listed API events once into (event, Event) pairs, dropping events without a start."""
+    parsed = []
+    for event in events:
+        model = Event.from_api(event)
+        if model is not None:
+            parsed.append((event, model))
+    return parsed
+
+def group_events_by_date(events, parsed=None):
+    """
+    Groups timed events by date in the shape used as AI scheduling context; an event that
+    runs past midnight is listed under each day it covers.
+    """
     events_by_date = {}
     
-    for event in events:
-        if 'dateTime' in event.get('start', {}):
-            event_start = datetime.fromisoformat(event['start']['dateTime'])
-            event_date = event_start.strftime("%Y-%m-%d")
-            
-            if event_date not in events_by_date:
-                events_by_date[event_date] = []
-            
-            events_by_date[event_date].append({
-                'summary': event.get('summary', 'Untitled Event'),
-                'start': event['start']['dateTime'],
-                'end': event['end']['dateTime'],
-                'start_time': event_start.strftime("%H:%M"),
-                'end_time': datetime.fromisoformat(event['end']['dateTime']).strftime("%H:%M")
-            })
+    for _, event in parsed if parsed is not None else parse_events(events):
+        if not event.all_day:
+            for start, end in split_at_midnight(event.start, event.end):
+                piece = Event(event.summary, start, end, tz=event.tz)
+                events_by_date.setdefault(piece.date, []).append(piece.to_dict())
     
     return events_by_date
 
-def insert_event(credentials_dict, task):
-    creds = google.oauth2.credentials.Credentials(**credentials_dict)
-    service = build('calendar', 'v3', credentials=creds)
+def busy_times_from_events(events, parsed=None):
+    """
+    Derives sorted epoch-minute busy intervals from listed events. Like freebusy, events marked
+    "free" (transparent) and events the user declined don't block time; all-day events do.
+    """
+    busy = []
+
+    for event, model in parsed if parsed is not None else parse_events(events):
+        if event.get('transparency') == 'transparent' or event.get('status') == 'cancelled':
+            continue
+        if any(a.get('self') and a.get('responseStatus') == 'declined' for a in event.get('attendees', [])):
+            continue
+        busy.append((model.start, model.end))
+
+    busy.sort()
+    return busy
+
+def _list_event_changes(service, sync_token):
+    """
+    Lists every page of events().list, incrementally from sync_token if given, otherwise as a
+    full sync from EVENT_SYNC_LOOKBACK_DAYS ago. Returns (items, next_sync_token).
+    """
+    params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': 2500}
+    if sync_token:
+        params['syncToken'] = sync_token
+    else:
+        lookback = datetime.now(TIMEZONE) - timedelta(days=EVENT_SYNC_LOOKBACK_DAYS)
+        params['timeMin'] = lookback.isoformat()
+
+    items = []
+    page_token = None
+
+    while True:
+        metrics.inc(metrics.API_CALLS, api='calendar', method='events.list')
+        events_result = outbound.calendar_provider.call(service.events().list(pageToken=page_token, **params).execute)
+        items.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return items, events_result.get('nextSyncToken')
+
+def sync_events(user):
+    """
+    Brings the user's local event store up to date. The first call does a full sync;
+    after that only the changes since the stored sync token are fetched.
+    """
+    sync_token = event_store.get_sync_token(user)
+
+    with metrics.span('events_list', source='sync'), calendar_service(user) as service:
+        try:
+            items, next_sync_token = _list_event_changes(service, sync_token)
+        except HttpError as e:
+            # 410 Gone: the sync token expired and Google requires a full resync
+            if sync_token is None or e.resp.status != 410:
+                raise
+            metrics.inc(metrics.RETRIES, operation='event_sync_full_resync')
+            sync_token = None
+            items, next_sync_token = _list_event_changes(service, None)
+
+    event_store.apply_changes(user, items, next_sync_token, full_sync=sync_token is None)
+    print(f"DEBUG: Synced {len(items)} event change(s) ({'incremental' if sync_token else 'full'})")
+
+def _load_events(user, time_min, time_max):
+    if USE_EVENT_STORE:
+        sync_events(user)
+        return event_store.query_events(user, time_min, time_max)
+
+    with metrics.span('events_list', source='api'), calendar_service(user) as service:
+        return list_events(service, time_min, time_max)
+
+def _other_calendars_busy(user, time_min, time_max):
+    """
+    Busy time of the availability calendars other than primary (whose events are listed
+    in full), from one freebusy query. Returns ({calendar_id: [(start, end)]}, {calendar_id: name}).
+    """
+    with calendar_service(user) as service:
+        calendars = get_availability_calendars(user, service)
+        others = [calendar_id for calendar_id in calendars if calendar_id != 'primary']
+        if not others:
+            return {}, calendars
+        with metrics.span('freebusy'):
+            return query_busy(service, others, time_min, time_max), calendars
+
+def split_at_midnight(start, end):
+    """Yields the (start, end) epoch-minute pieces of an interval, cut at every local midnight it spans."""
+    while start < end:
+        next_day = to_datetime(start).date() + timedelta(days=1)
+        midnight = to_minutes(datetime(next_day.year, next_day.month, next_day.day))
+        yield start, min(end, midnight)
+        start = midnight
+
+def add_busy_to_context(events_by_date, busy_by_calendar, names):
+    """
+    Adds other calendars' busy blocks to the per-day events context as "Busy (<calendar>)"
+    entries, so the AI and the schedule repair avoid them like any other event.
+    A block that runs past midnight is listed under each day it covers, like the free-slot grid.
+    """
+    for calendar_id, busy in busy_by_calendar.items():
+        for start, end in busy:
+            for piece_start, piece_end in split_at_midnight(start, end):
+                event = Event(f"Busy ({names.get(calendar_id, calendar_id)})", piece_start, piece_end)
+                events_by_date.setdefault(event.date, []).append(event.to_dict())
+
+    for events in events_by_date.values():
+        events.sort(key=lambda event: event['start'])
+    return events_by_date
+
+def get_existing_events_for_ai(user, start_date, num_days=7):
+    """
+    Get existing calendar events formatted for AI scheduling context.
+    This helps the AI understand what's already scheduled to avoid conflicts.
+    Busy time on the user's other availability calendars is included as "Busy" entries.
+    """
+    time_min, time_max = _events_window(start_date, num_days)
+    events_by_date = group_events_by_date(_load_events(user, time_min, time_max))
+    return add_busy_to_context(events_by_date, *_other_calendars_busy(user, time_min, time_max))
 
+def get_availability(user, start_date, num_days=7):
+    """
+    Loads the user's events over the horizon once (from the synced local store, or a single
+    events listing) and derives both the per-day free slots (same shape as
+    get_free_slots_multi_day) and the per-day events context (same shape as
+    get_existing_events_for_ai), instead of a freebusy query plus a separate events listing.
+    The user's other availability calendars are covered by one freebusy query for all of
+    them (none if primary is the only one), and their busy time is merged in locally.
+    That query runs alongside the events load, so it doesn't add a round trip.
+    Returns (multi_day_slots, events_by_date).
+    """
+    time_min, time_max = _events_window(start_date, num_days)
+    other = freebusy_executor.submit(_other_calendars_busy, user, time_min, time_max)
+    events = _load_events(user, time_min, time_max)
+    other_busy, names = other.result()
+
+    if start_date.tzinfo is None:
+        start_date = TIMEZONE.localize(start_date)
+
+    # Each event's times are parsed once and shared by the free-slot and events-context views
+    parsed = parse_events(events)
+    busy_by_calendar = dict(other_busy, primary=busy_times_from_events(events, parsed))
+    multi_day_slots = split_free_slots_by_day(busy_by_calendar, start_date, num_days)
+    return multi_day_slots, add_busy_to_context(group_events_by_date(events, parsed), other_busy, names)
+
+def event_id_for(*parts):
+    """
+    Deterministic Calendar event ID (base32hex of a SHA-1 of the parts). Google rejects a
+    second insert with the same ID with 409, so running a request again can't duplicate it.
+    """
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return base64.b32hexencode(digest).decode('ascii').rstrip('=').lower()
+
+def event_body_for_task(task, event_id=None):
     event = {
         'summary': task['task_name'],
         'start': {
             'dateTime': task['start'],
-            'timeZone': 'Asia/Kolkata'
+            'timeZone': TIMEZONE.zone
         },
         'end': {
             'dateTime': task['end'],
-            'timeZone': 'Asia/Kolkata'
+            'timeZone': TIMEZONE.zone
         }
     }
+    if event_id:
+        event['id'] = event_id
+    return event
+
+class EventDeletedError(Exception):
+    """Raised when a task's event was inserted by an earlier run and has since been deleted."""
 
-    event = service.events().insert(calendarId='primary', body=event).execute()
+def insert_event(user, task, event_id=None):
+    """
+    Inserts one task and returns its link. With an event_id (see event_id_for) inserting
+    the same task again returns the existing event instead of creating a duplicate, and
+    raises EventDeletedError if the user has deleted that event in the meantime.
+    """
+    event = event_body_for_task(task, event_id)
+
+    with metrics.span('insert'), calendar_service(user) as service:
+        metrics.inc(metrics.API_CALLS, api='calendar', method='events.insert')
+        try:
+            # With a fixed ID a retried insert can't create a second event, so it is safe to retry
+            event = outbound.calendar_provider.call(
+                service.events().insert(calendarId='primary', body=event).execute, idempotent=event_id is not None
+            )
+        except HttpError as e:
+            if event_id is None or outbound.error_status(e) != 409:
+                raise
+            print(f"DEBUG: {task['task_name']} was already inserted as {event_id}")
+            metrics.inc(metrics.API_CALLS, api='calendar', method='events.get')
+            event = outbound.calendar_provider.call(service.events().get(calendarId='primary', eventId=event_id).execute)
+            if event.get('status') == 'cancelled':
+                raise EventDeletedError(f"{task['task_name']} was deleted from the calendar after an earlier run; not adding it again")
     return event['htmlLink']
 
-def update_free_slots_after_scheduling(free_slots, scheduled_task, buffer_minutes=5):
-   
-    updated_slots = {}
-    task_start = datetime.fromisoformat(scheduled_task['start'])
-    task_end = datetime.fromisoformat(scheduled_task['end'])
-    
-    # Add buffer to task timings
-    buffer = timedelta(minutes=buffer_minutes)
-    buffered_task_start = task_start - buffer
-    buffered_task_end = task_end + buffer
-    
-    for date, slots in free_slots.items():
-        date_obj = datetime.strptime(date, "%Y-%m-%d")
-        date_updated_slots = []
-        
-        for slot in slots:
-            slot_start = datetime.fromisoformat(slot['start'])
-            slot_end = datetime.fromisoformat(slot['end'])
-            
-            # If the slot ends before the task starts or starts after the task ends, keep it
-            if slot_end <= buffered_task_start or slot_start >= buffered_task_end:
-                date_updated_slots.append(slot)
-        
-        updated_slots[date] = date_updated_slots
-    
-    return updated_slots
+# Google Calendar accepts at most 50 calls per batch request
+INSERT_BATCH_SIZE = 50
+
+def insert_events(user, tasks):
+    """
+    Inserts all tasks through the Calendar batch endpoint, one HTTP round trip per 50 events.
+    Returns one {'link': ..., 'error': ...} dict per task, in the same order as tasks.
+    A failed insert only marks its own task as failed; the rest are still committed.
+    Inserts rejected by the rate limit are sent again in a later batch, with backoff.
+    """
+    results = [{'link': None, 'error': None} for _ in tasks]
+    rate_limited = set()
+
+    def on_inserted(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None:
+            results[i]['error'] = str(exception)
+            if outbound.is_rate_limited(exception):
+                rate_limited.add(i)
+        else:
+            results[i] = {'link': response.get('htmlLink'), 'error': None}
+
+    pending = []
+    for i, task in enumerate(tasks):
+        try:
+            pending.append((i, event_body_for_task(task)))
+        except KeyError as e:
+            results[i]['error'] = f"Task is missing field {e}"
+
+    try:
+        with metrics.span('insert_batch'), calendar_service(user) as service:
+            for attempt in range(outbound.OUTBOUND_MAX_RETRIES + 1):
+                rate_limited.clear()
+                for offset in range(0, len(pending), INSERT_BATCH_SIZE):
+                    batch = service.new_batch_http_request(callback=on_inserted)
+                    for i, body in pending[offset:offset + INSERT_BATCH_SIZE]:
+                        batch.add(service.events().insert(calendarId='primary', body=body), request_id=str(i))
+                    metrics.inc(metrics.API_CALLS, api='calendar', method='batch')
+                    outbound.calendar_provider.call(batch.execute, idempotent=False)
+
+                # Rate-limited parts created nothing, so they are safe to send again
+                pending = [(i, body) for i, body in pending if i in rate_limited]
+                if not pending or attempt == outbound.OUTBOUND_MAX_RETRIES:
+                    break
+                metrics.inc(metrics.RETRIES, len(pending), operation='calendar_batch_parts')
+                time.sleep(outbound.calendar_provider.backoff_seconds(attempt))
+    except Exception as e:
+        # The batch request itself failed: every task without an outcome shares that error
+        for result in results:
+            if result['link'] is None and result['error'] is None:
+                result['error'] = str(e)
+
+    return results
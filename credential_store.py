@@ -0,0 +1,175 @@
+"""
+Server-side OAuth credential store.
+
+The session cookie only holds the user's key; the current access token lives here (SQLite,
+plus one shared in-memory Credentials object per user). Tokens are refreshed proactively
+shortly before they expire, concurrent refreshes for the same user are coalesced into one,
+and every refreshed token is saved, so API calls never pay for a refresh round trip of
+their own and a restart doesn't throw the refreshed token away.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import google.oauth2.credentials
+import google_auth_httplib2
+import httplib2
+
+from auth import user_key_for
+import metrics
+
+CREDENTIAL_STORE_PATH = os.getenv("CREDENTIAL_STORE_PATH", "credential_store.sqlite3")
+# Refresh this long before the access token expires
+CREDENTIAL_REFRESH_MARGIN_SECONDS = int(os.getenv("CREDENTIAL_REFRESH_MARGIN_SECONDS", "300"))
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+_credentials = {}     # user -> shared google Credentials object
+_saved_tokens = {}    # user -> access token last written to the store
+_refresh_locks = {}   # user -> lock held while that user's token is being refreshed
+_credentials_lock = threading.Lock()
+
+class MissingCredentialsError(Exception):
+    """Raised when the store has no credentials for a user key, e.g. after the store was reset."""
+
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(CREDENTIAL_STORE_PATH, timeout=30)
+
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS credentials (
+                    user TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL
+                )
+            """)
+            _schema_ready = True
+
+    return conn
+
+def _to_record(creds):
+    return {
+        'token': creds.token,
+        'refresh_token': creds.refresh_token,
+        'token_uri': creds.token_uri,
+        'client_id': creds.client_id,
+        'client_secret': creds.client_secret,
+        'scopes': list(creds.scopes) if creds.scopes else None,
+        # google-auth keeps expiry as naive UTC
+        'expiry': creds.expiry.isoformat() if creds.expiry else None,
+    }
+
+def _from_record(record):
+    record = dict(record)
+    expiry = record.pop('expiry', None)
+    creds = google.oauth2.credentials.Credentials(**record)
+    creds.expiry = datetime.fromisoformat(expiry) if expiry else None
+    return creds
+
+def _save(user, creds):
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO credentials (user, data, updated_at) VALUES (?, ?, ?)",
+                (user, json.dumps(_to_record(creds)), datetime.now().timestamp())
+            )
+    finally:
+        conn.close()
+    _saved_tokens[user] = creds.token
+
+def _load(user):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT data FROM credentials WHERE user = ?", (user,)).fetchone()
+    finally:
+        conn.close()
+    return _from_record(json.loads(row[0])) if row else None
+
+def save_credentials(creds, account_id):
+    """
+    Stores freshly issued credentials (from the OAuth callback) for the account (its primary
+    calendar ID, see calendar_api.primary_calendar_id), makes them the user's current ones
+    and returns the user key.
+    """
+    user = user_key_for(account_id)
+    creds = _from_record(_to_record(creds))
+    with _credentials_lock:
+        _credentials[user] = creds
+    _save(user, creds)
+    return user
+
+def _needs_refresh(creds):
+    if not creds.token:
+        return True
+    if creds.expiry is None:
+        return False
+    return creds.expiry - datetime.utcnow() < timedelta(seconds=CREDENTIAL_REFRESH_MARGIN_SECONDS)
+
+def _refresh(user, creds):
+    with _credentials_lock:
+        lock = _refresh_locks.setdefault(user, threading.Lock())
+
+    with lock:
+        # Someone else may have refreshed while we waited for the lock
+        if not _needs_refresh(creds):
+            metrics.inc(metrics.TOKEN_REFRESHES, result='coalesced')
+            return
+        with metrics.span('token_refresh'):
+            creds.refresh(google_auth_httplib2.Request(httplib2.Http()))
+        metrics.inc(metrics.TOKEN_REFRESHES, result='refreshed')
+        _save(user, creds)
+
+def register_credentials(creds_dict, account_id):
+    """
+    Returns the user key for the account, seeding the store with a credentials dict (batch
+    credential files, see auth.credentials_to_dict) if that user has nothing stored yet.
+    Credentials already in the store are kept, since they may have been refreshed since.
+    """
+    user = user_key_for(account_id)
+    with _credentials_lock:
+        if user in _credentials:
+            return user
+    creds = _load(user)
+    with _credentials_lock:
+        seeded = creds is None and user not in _credentials
+        if seeded:
+            creds = google.oauth2.credentials.Credentials(**creds_dict)
+        _credentials.setdefault(user, creds)
+    if seeded:
+        _save(user, creds)
+    return user
+
+def _cached_or_stored(user):
+    with _credentials_lock:
+        creds = _credentials.get(user)
+    if creds is not None:
+        return creds
+    creds = _load(user)
+    if creds is None:
+        raise MissingCredentialsError("No stored credentials for this user; please log in again")
+    _saved_tokens[user] = creds.token
+    with _credentials_lock:
+        return _credentials.setdefault(user, creds)
+
+def get_credentials(user):
+    """
+    Returns the user's shared Credentials object, refreshed if it expires within
+    CREDENTIAL_REFRESH_MARGIN_SECONDS. user is the key from save_credentials or
+    register_credentials; raises MissingCredentialsError if nothing is stored for it.
+    """
+    creds = _cached_or_stored(user)
+
+    if _needs_refresh(creds):
+        _refresh(user, creds)
+    elif creds.token != _saved_tokens.get(user):
+        # The HTTP layer refreshed it on a 401; keep the store current too
+        _save(user, creds)
+
+    return creds
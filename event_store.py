@@ -0,0 +1,96 @@
+"""
+Local per-user calendar event store (SQLite), kept current by calendar_api.sync_events
+with the Calendar API's incremental sync tokens.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from models import Event
+
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH", "event_store.sqlite3")
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(EVENT_STORE_PATH, timeout=30)
+
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    user TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (user, event_id)
+                );
+                CREATE INDEX IF NOT EXISTS events_by_time ON events (user, start_ts);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    user TEXT PRIMARY KEY,
+                    sync_token TEXT,
+                    synced_at REAL
+                );
+            """)
+            _schema_ready = True
+
+    return conn
+
+def _event_bounds(event):
+    """Epoch-second (start, end) of an event; all-day events span whole local days."""
+    parsed = Event.from_api(event)
+    return (parsed.start * 60, parsed.end * 60) if parsed else None
+
+def get_sync_token(user):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT sync_token FROM sync_state WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def apply_changes(user, items, next_sync_token, full_sync=False):
+    """
+    Applies a page set from events().list to the store: cancelled events are deleted,
+    everything else is upserted. A full sync replaces everything stored for the user.
+    """
+    conn = _connect()
+    try:
+        with conn:
+            if full_sync:
+                conn.execute("DELETE FROM events WHERE user = ?", (user,))
+
+            for event in items:
+                bounds = _event_bounds(event)
+                if event.get('status') == 'cancelled' or bounds is None:
+                    conn.execute("DELETE FROM events WHERE user = ? AND event_id = ?", (user, event['id']))
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO events (user, event_id, start_ts, end_ts, data) VALUES (?, ?, ?, ?, ?)",
+                    (user, event['id'], bounds[0], bounds[1], json.dumps(event))
+                )
+
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (user, sync_token, synced_at) VALUES (?, ?, ?)",
+                (user, next_sync_token, datetime.now().timestamp())
+            )
+    finally:
+        conn.close()
+
+def query_events(user, time_min, time_max):
+    """Stored events overlapping [time_min, time_max), ordered by start, as raw API event dicts."""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT data FROM events WHERE user = ? AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+            (user, time_max.timestamp(), time_min.timestamp())
+        ).fetchall()
+    finally:
+        conn.close()
+    return [json.loads(row[0]) for row in rows]
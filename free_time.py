@@ -0,0 +1,168 @@
+"""
+Free-time index: per-day sorted free intervals with bisect lookups.
+All times are epoch minutes (see models).
+"""
+from bisect import bisect_left, bisect_right, insort
+
+from models import TIMEZONE, Slot, day_key
+
+class FreeTimeIndex:
+    """
+    Free time per day as two parallel sorted lists (starts, ends) of epoch minutes.
+    Intervals within a day never overlap, so both lists are sorted together and
+    any point in time can be located with a single bisect. The day keys are kept in a
+    sorted list too, so the days a lookup touches are found by bisect as well.
+    """
+
+    def __init__(self, tz=TIMEZONE):
+        self.days = {}
+        self.dates = []
+        self.tz = tz
+
+    @classmethod
+    def from_slots(cls, multi_day_slots, tz=TIMEZONE):
+        """Builds the index from the {date: [{'start', 'end'}]} shape returned by calendar_api."""
+        index = cls(tz)
+        for date, slots in multi_day_slots.items():
+            intervals = sorted((slot.start, slot.end) for slot in (Slot.from_dict(slot, tz) for slot in slots))
+            index.days[date] = ([start for start, _ in intervals], [end for _, end in intervals])
+            insort(index.dates, date)
+        return index
+
+    def to_slots(self):
+        """Serializes back to the {date: [{'start', 'end'}]} shape."""
+        return {
+            date: [Slot(start, end, self.tz).to_dict() for start, end in zip(starts, ends)]
+            for date, (starts, ends) in self.days.items()
+        }
+
+    def _days_touching(self, start, end):
+        lo = bisect_left(self.dates, day_key(start, self.tz))
+        hi = bisect_right(self.dates, day_key(end, self.tz))
+        return self.dates[lo:hi]
+
+    def _intervals_from(self, at):
+        """(start, end) of the free intervals that end after `at`, in time order."""
+        for d in range(bisect_left(self.dates, day_key(at, self.tz)), len(self.dates)):
+            starts, ends = self.days[self.dates[d]]
+            for i in range(bisect_right(ends, at), len(starts)):
+                yield starts[i], ends[i]
+
+    def _intervals_before(self, at):
+        """(start, end) of the free intervals that start before `at`, latest first."""
+        for d in range(bisect_right(self.dates, day_key(at, self.tz)) - 1, -1, -1):
+            starts, ends = self.days[self.dates[d]]
+            for i in range(bisect_left(starts, at) - 1, -1, -1):
+                yield starts[i], ends[i]
+
+    def carve(self, start, end, buffer_minutes=0):
+        """
+        Removes [start - buffer, end + buffer) from the free time, splitting any
+        interval it cuts so the leftover time before and after is kept.
+        """
+        start -= buffer_minutes
+        end += buffer_minutes
+
+        for date in self._days_touching(start, end):
+            starts, ends = self.days[date]
+            # First interval that ends after start, and first one that starts at/after end
+            lo = bisect_right(ends, start)
+            hi = bisect_left(starts, end, lo)
+            if lo >= hi:
+                continue
+
+            new_starts = []
+            new_ends = []
+            if starts[lo] < start:
+                new_starts.append(starts[lo])
+                new_ends.append(start)
+            if end < ends[hi - 1]:
+                new_starts.append(end)
+                new_ends.append(ends[hi - 1])
+
+            starts[lo:hi] = new_starts
+            ends[lo:hi] = new_ends
+
+    def is_free(self, start, end):
+        """True if [start, end) lies entirely inside one free interval."""
+        starts, ends = self.days.get(day_key(start, self.tz), ([], []))
+        i = bisect_right(starts, start) - 1
+        return i >= 0 and ends[i] >= end
+
+    def first_fit(self, duration, not_before, deadline=None):
+        """
+        Earliest start at or after not_before where `duration` minutes fit in one free interval,
+        finishing by deadline if given. Returns None if nothing fits.
+        """
+        for slot_start, slot_end in self._intervals_from(not_before):
+            start = max(slot_start, not_before)
+            if deadline is not None and start + duration > deadline:
+                return None
+            if start + duration <= slot_end:
+                return start
+        return None
+
+    def nearest_fit(self, duration, around, deadline=None, not_before=None):
+        """
+        Start closest to `around` (earlier or later) where `duration` minutes fit in one free
+        interval, starting no earlier than not_before and finishing by deadline if given.
+        Returns None if nothing fits.
+        Walks outwards from `around` in both directions: the first interval that fits on each
+        side is the closest on that side, and each walk stops at the deadline / not_before.
+        """
+        def fit(slot_start, slot_end):
+            earliest_start = slot_start if not_before is None else max(slot_start, not_before)
+            latest_end = slot_end if deadline is None else min(slot_end, deadline)
+            if earliest_start + duration > latest_end:
+                return None
+            # Clamp the preferred start into this interval's feasible range
+            return min(max(around, earliest_start), latest_end - duration)
+
+        later = None
+        for slot_start, slot_end in self._intervals_from(around):
+            if deadline is not None and max(slot_start, around) + duration > deadline:
+                break
+            later = fit(slot_start, slot_end)
+            # The interval around `around` may only fit earlier on; the other walk finds that
+            if later is not None and later >= around:
+                break
+            later = None
+
+        earlier = None
+        for slot_start, slot_end in self._intervals_before(around):
+            if not_before is not None and slot_end - duration < not_before:
+                break
+            earlier = fit(slot_start, slot_end)
+            if earlier is not None and earlier <= around:
+                break
+            earlier = None
+
+        if earlier is None or (later is not None and abs(later - around) < abs(earlier - around)):
+            return later
+        return earlier
+
+class BusyIndex:
+    """
+    Busy time as disjoint, merged intervals in two parallel sorted lists, so
+    overlap checks are a single bisect even when the added intervals overlap.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start, end):
+        # Merge with every interval that overlaps or touches [start, end)
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end, lo)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def overlaps(self, start, end):
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
@@ -1,17 +1,106 @@
 """
 OpenAI GPT integration for task parsing module.
 """
+import copy
 import json
 import os
+import re
+import threading
+from concurrent.futures import Future
+from cachetools import TTLCache
 from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
+import llm_output
+import metrics
+import model_router
+from models import TIMEZONE, parse_minutes, to_datetime
+import outbound
+
 # Load environment variables
 load_dotenv()
 
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are done by outbound.openai_provider (with rate limiting and a circuit breaker), not the SDK
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+# LRU + TTL cache of parse results, so resubmissions (double clicks, retries,
+# priority-only edits) don't pay for another GPT parse
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "256"))
+PARSE_CACHE_TTL_SECONDS = int(os.getenv("PARSE_CACHE_TTL_SECONDS", "600"))
+
+_parse_cache = TTLCache(maxsize=PARSE_CACHE_SIZE, ttl=PARSE_CACHE_TTL_SECONDS)
+_parse_in_flight = {}  # cache key -> Future shared by concurrent identical requests
+_parse_cache_lock = threading.Lock()
+_parse_cache_stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+metrics.register_collector(
+    'scheduler_parse_cache_requests_total', 'counter', "Parse cache lookups by result",
+    lambda: [({'result': result}, count) for result, count in get_parse_cache_stats().items() if result in _parse_cache_stats]
+)
+metrics.register_collector(
+    'scheduler_parse_cache_entries', 'gauge', "Parse results currently cached",
+    lambda: [({}, len(_parse_cache))]
+)
+
+#Compact prompt encodings: one line per day with HH:MM ranges instead of JSON with
+#full ISO timestamps (and timezone suffix) on every slot and event edge.
+def _clock_time(value, prefix):
+    """
+    HH:MM of an ISO slot edge in TIMEZONE. Edges that start with the day's date and end
+    with its UTC offset (everything models.format_minutes writes) are read straight off
+    the string; anything else is parsed.
+    """
+    if len(value) == 25 and value.startswith(prefix[:11]) and value.endswith(prefix[11:]):
+        return value[11:16]
+    return to_datetime(parse_minutes(value)).strftime('%H:%M')
+
+def encode_slots_for_prompt(multi_day_slots):
+    """Encodes {date: [{'start', 'end'}]} as lines like "2025-07-14 Mon: 08:00-09:30, 11:00-19:00"."""
+    lines = []
+    for date in sorted(multi_day_slots):
+        day = TIMEZONE.localize(datetime.strptime(date, "%Y-%m-%d"))
+        # "YYYY-MM-DDT" + "+HH:MM": the shape of an edge on this day in the app timezone
+        prefix = day.isoformat()[:11] + day.isoformat()[19:]
+        ranges = ", ".join(
+            f"{_clock_time(slot['start'], prefix)}-{_clock_time(slot['end'], prefix)}"
+            for slot in multi_day_slots[date]
+        )
+        lines.append(f"{date} {day.strftime('%a')}: {ranges or 'no free time'}")
+    return "\n".join(lines)
+
+def encode_events_for_prompt(existing_events):
+    """Encodes the per-day events context as lines like "2025-07-14: 09:00-10:00 Standup; 14:00-15:00 1:1"."""
+    lines = []
+    for date in sorted(existing_events):
+        events = "; ".join(f"{event['start_time']}-{event['end_time']} {event['summary']}" for event in existing_events[date])
+        lines.append(f"{date}: {events}")
+    return "\n".join(lines)
+
+def decode_task_times(task):
+    """Expands the compact "YYYY-MM-DDTHH:MM" times the model returns into full ISO 8601 with the Asia/Kolkata offset."""
+    for key in ('start', 'end'):
+        value = task.get(key)
+        if not isinstance(value, str):
+            continue
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            continue
+        if dt.tzinfo is None:
+            dt = TIMEZONE.localize(dt)
+        task[key] = dt.isoformat()
+    return task
+
+def log_token_usage(label, prompt, usage):
+    """Logs the prompt size and the token counts the API reports for a completion, and counts them in /metrics."""
+    if usage is None:
+        print(f"DEBUG: {label} prompt: {len(prompt)} chars (~{len(prompt) // 4} tokens), no usage reported")
+        return
+    metrics.inc(metrics.LLM_TOKENS, usage.prompt_tokens, call=label, kind='prompt')
+    metrics.inc(metrics.LLM_TOKENS, usage.completion_tokens, call=label, kind='completion')
+    print(f"DEBUG: {label} tokens: prompt={usage.prompt_tokens} completion={usage.completion_tokens} ({len(prompt)} prompt chars)")
 
 #get JSON format from user inputs
 def generate_task_prompt(user_input, user_priority):
@@ -23,7 +112,7 @@ def generate_task_prompt(user_input, user_priority):
     day_of_week = today.strftime("%A")
     
     return f"""
-You are a smart scheduling assistant. A user will describe their day's plans in natural language. Your task is to convert the description into a JSON array of task objects, based on the following schema:
+You are a smart scheduling assistant. A user will describe their day's plans in natural language. Your task is to convert the description into a JSON object {{"tasks": [...]}} holding a list of task objects, based on the following schema:
 
 ### CURRENT DATE CONTEXT:
 - Today: {today_str} ({day_of_week})
@@ -42,7 +131,7 @@ Each task must include:
 
 - task_name (string): a short name summarizing the task
 - duration (integer): estimated duration in minutes
-- start_time : full ISO 8601 string (e.g. "2025-07-13T09:00:00+05:30") 
+- start_time : full ISO 8601 string (e.g. "2025-07-13T09:00:00+05:30"), or null when the task is not fixed
 - deadline (required): full ISO 8601 string — latest time by which the task must be finished
 - priority: one of "high", "medium", or "low" — inferred from urgency or keywords
 - fixed (boolean): true if the task has a specific start time, false otherwise
@@ -55,16 +144,16 @@ Each task must include:
 - If no time is given at all, set `fixed = false` and use the task date at 10pm as the default `deadline`.
 - If no duration is mentioned, default to 60 minutes.
 - IMPORTANT: Parse dates correctly - "meeting tomorrow" should have date = "{tomorrow.strftime("%Y-%m-%d")}"
-- Do not return empty/null values. Only return valid JSON.
+- Do not return empty values; null is only allowed for `start_time`. Only return valid JSON.
 
 ### Output Format:
-Return ONLY a clean JSON array with the required fields, and nothing else.
+Return ONLY a clean JSON object of the form {{"tasks": [...]}} with the required fields, and nothing else.
 
 ### Example Input:
 "Gym at 7pm today. Meeting with John tomorrow at 2pm. Finish report before 3pm."
 
 ### Example Output:
-[
+{{"tasks": [
   {{
     "task_name": "Gym",
     "duration": 60,
@@ -86,24 +175,32 @@ Return ONLY a clean JSON array with the required fields, and nothing else.
   {{
     "task_name": "Finish report",
     "duration": 90,
+    "start_time": null,
     "deadline": "{today_str}T15:00:00+05:30",
     "priority": "high",
     "fixed": false,
     "date": "{today_str}"
   }}
-]
+]}}
 
 ### User Input:
 \"\"\"{user_input}\"\"\"
 """
 #Act as a smart scheduler
-def generate_ai_schedule_prompt(user_input, user_priority, multi_day_slots):
+def generate_ai_schedule_prompt(user_input, user_priority, multi_day_slots, existing_events=None):
     """Generates a comprehensive prompt for AI to handle both parsing and intelligent scheduling across multiple days."""
     today = datetime.now()
     today_str = today.strftime("%Y-%m-%d")
     tomorrow = today + timedelta(days=1)
     tomorrow_str = tomorrow.strftime("%Y-%m-%d")
     day_of_week = today.strftime("%A")
+
+    existing_events_context = ""
+    if existing_events:
+        existing_events_context = f"""
+### Existing Calendar Events (DO NOT DOUBLE-BOOK):
+{encode_events_for_prompt(existing_events)}
+"""
     
     return f"""
 You are an expert AI scheduling assistant. Your job is to:
@@ -124,9 +221,9 @@ You are an expert AI scheduling assistant. Your job is to:
 - "this Friday" = the upcoming Friday
 - If NO date is mentioned, assume TODAY ({today_str})
 
-### Available Free Time Slots (Multiple Days):
-{json.dumps(multi_day_slots, indent=2)}
-
+### Available Free Time Slots (Multiple Days, Asia/Kolkata, 24h HH:MM-HH:MM):
+{encode_slots_for_prompt(multi_day_slots)}
+{existing_events_context}
 ### Scheduling Rules:
 - Working hours: 8:00 AM to 7:00 PM (Asia/Kolkata timezone)
 - Schedule tasks on their intended dates (today, tomorrow, specific dates)
@@ -197,8 +294,8 @@ You are an expert AI scheduling assistant. Your job is to:
   "scheduled_tasks": [
     {{
       "task_name": "string",
-      "start": "ISO 8601 datetime string",
-      "end": "ISO 8601 datetime string", 
+      "start": "YYYY-MM-DDTHH:MM (Asia/Kolkata, no seconds or offset)",
+      "end": "YYYY-MM-DDTHH:MM (Asia/Kolkata, no seconds or offset)",
       "status": "on-time" or "late",
       "priority": "high/medium/low",
       "reasoning": "brief explanation of placement decision"
@@ -210,7 +307,10 @@ You are an expert AI scheduling assistant. Your job is to:
       "reason": "why it wasn't scheduled (e.g., 'No available time slots', 'Conflicts with existing events', etc.)"
     }}
   ],
-  "reasoning_logs": "Concise thought process of how the AI approached the scheduling decisions - what it considered, prioritized, or optimized for"
+  "reasoning_logs": "Concise thought process of how the AI approached the scheduling decisions - what it considered, prioritized, or optimized for",
+  "schedule_insights": [
+    "Key insight about the schedule you created"
+  ]
 }}
 
 ### IMPORTANT SCHEDULING RULES:
@@ -226,87 +326,124 @@ Tasks: "{user_input}"
 IMPORTANT: Return ONLY the JSON object - no other text, explanations, or formatting.
 """
 
-def extract_json_from_response(content):
-    # Try to parse as-is first
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
-    
-    # Look for JSON within code blocks
-    import re
-    
-    # Try to find JSON in ```json``` blocks
-    json_match = re.search(r'```json\s*(\{.*?\})\s*```', content, re.DOTALL)
-    if json_match:
-        try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
-            pass
-    
-    # Try to find any JSON object in the response (more flexible)
-    json_match = re.search(r'(\{.*\})', content, re.DOTALL)
-    if json_match:
-        try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
-            pass
-    
-    # If all else fails, raise the original error with helpful debug info
-    print(f"DEBUG - AI Response Content:\n{content}")
-    raise ValueError("AI response was not valid JSON. Please check the debug output above.")
-
-def ai_schedule_tasks(user_input, user_priority, multi_day_slots):
-    prompt = generate_ai_schedule_prompt(user_input, user_priority, multi_day_slots)
-
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an expert AI scheduling assistant that creates optimized daily schedules. You must return ONLY valid JSON without any markdown formatting or explanatory text. The response must start with { and end with }."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3
+def _response_format_kwargs(model, name, schema):
+    """response_format for create(), omitted entirely for models without a JSON output mode."""
+    response_format = llm_output.response_format(model, name, schema)
+    return {"response_format": response_format} if response_format else {}
+
+AI_SCHEDULE_SYSTEM_PROMPT = "You are an expert AI scheduling assistant that creates optimized daily schedules. You must return ONLY valid JSON without any markdown formatting or explanatory text. The response must start with { and end with }."
+
+def ai_schedule_tasks(user_input, user_priority, multi_day_slots, existing_events=None):
+    """
+    Fused pipeline: parses the user input and schedules it in a single completion.
+    Returns the same (scheduled, skipped, summary, insights) tuple as agentic_batch_schedule.
+    Small requests try the cheaper model first (see model_router).
+    """
+    prompt = generate_ai_schedule_prompt(user_input, user_priority, multi_day_slots, existing_events)
+
+    def attempt(model):
+        with metrics.span('gpt_schedule', mode='fused'):
+            metrics.inc(metrics.API_CALLS, api='openai', method='chat.completions')
+            response = outbound.openai_provider.call(
+                client.chat.completions.create,
+                model=model,
+                messages=[
+                    {"role": "system", "content": AI_SCHEDULE_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                **_response_format_kwargs(model, 'schedule', llm_output.schedule_schema("reasoning_logs"))
+            )
+        log_token_usage(f"Fused schedule ({model})", prompt, response.usage)
+
+        return llm_output.decode_schedule(response.choices[0].message.content, "reasoning_logs", decode_task_times)
+
+    return model_router.call_with_escalation(
+        'fused_schedule', attempt, llm_output.validate_schedule,
+        input_chars=len(user_input),
+        task_count=model_router.estimate_task_count(user_input),
+        horizon_days=len(multi_day_slots)
     )
 
-    content = response.choices[0].message.content
+def _parse_cache_key(user_input):
+    # The parse prompt embeds today's date but not the priority dropdown,
+    # so only the (whitespace-normalized) text and the date matter
+    return " ".join(user_input.split()), datetime.now().strftime("%Y-%m-%d")
 
-    try:
-        result = extract_json_from_response(content)
-        return result.get("scheduled_tasks", []), result.get("skipped_tasks", []), result.get("reasoning_logs", "")
-    except ValueError as e:
-        raise e
+def get_parse_cache_stats():
+    """Hit/miss counters for the parse cache; 'coalesced' counts callers that waited on an in-flight parse."""
+    with _parse_cache_lock:
+        return dict(_parse_cache_stats, size=len(_parse_cache), maxsize=PARSE_CACHE_SIZE)
 
 def parse_tasks_with_gpt(user_input, user_priority):
-    """Uses OpenAI GPT to parse user input into structured task data."""
+    """
+    Uses OpenAI GPT to parse user input into structured task data.
+    Results are cached (LRU + TTL) and concurrent identical requests share one GPT call.
+    """
+    key = _parse_cache_key(user_input)
+
+    with _parse_cache_lock:
+        tasks = _parse_cache.get(key)
+        if tasks is not None:
+            _parse_cache_stats['hits'] += 1
+            return copy.deepcopy(tasks)
+
+        future = _parse_in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _parse_in_flight[key] = future
+            _parse_cache_stats['misses'] += 1
+        else:
+            _parse_cache_stats['coalesced'] += 1
+
+    if not leader:
+        return copy.deepcopy(future.result())
+
+    try:
+        tasks = _parse_tasks_uncached(user_input, user_priority)
+    except Exception as e:
+        with _parse_cache_lock:
+            del _parse_in_flight[key]
+        future.set_exception(e)
+        raise
+
+    with _parse_cache_lock:
+        _parse_cache[key] = tasks
+        del _parse_in_flight[key]
+    future.set_result(tasks)
+    return copy.deepcopy(tasks)
+
+def _parse_tasks_uncached(user_input, user_priority):
     prompt = generate_task_prompt(user_input, user_priority)
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You convert task descriptions into structured JSON for a calendar scheduling app."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.2
+    def attempt(model):
+        with metrics.span('gpt_parse'):
+            metrics.inc(metrics.API_CALLS, api='openai', method='chat.completions')
+            response = outbound.openai_provider.call(
+                client.chat.completions.create,
+                model=model,
+                messages=[
+                    {"role": "system", "content": "You convert task descriptions into structured JSON for a calendar scheduling app."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                **_response_format_kwargs(model, 'parsed_tasks', llm_output.PARSED_TASKS_SCHEMA)
+            )
+        log_token_usage(f"Task parse ({model})", prompt, response.usage)
+
+        return llm_output.decode_parsed_tasks(response.choices[0].message.content)
+
+    return model_router.call_with_escalation(
+        'parse', attempt, llm_output.validate_parsed_tasks,
+        input_chars=len(user_input),
+        task_count=model_router.estimate_task_count(user_input)
     )
 
-    content = response.choices[0].message.content
+AGENTIC_SYSTEM_PROMPT = "You are an elite agentic AI scheduler with advanced optimization capabilities. You must schedule ALL tasks optimally using sophisticated global reasoning. Return ONLY valid JSON without markdown formatting."
 
-    try:
-        tasks = json.loads(content)
-        return tasks
-    except json.JSONDecodeError:
-        raise ValueError("GPT response was not valid JSON:\n\n" + content)
-
-def agentic_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existing_events=None):
-    """
-    Agentic AI scheduler that processes ALL tasks at once for global optimization.
-    This is the truly intelligent scheduling function that considers:
-    - All tasks holistically 
-    - Cross-task dependencies and relationships
-    - Global priority optimization
-    - Intelligent conflict resolution
-    - Energy and productivity patterns
-    """
+def generate_agentic_schedule_prompt(parsed_tasks, user_priority, multi_day_slots, existing_events=None):
+    """Generates the agentic batch-scheduling prompt for already-parsed tasks."""
     today = datetime.now()
     today_str = today.strftime("%Y-%m-%d")
     tomorrow = today + timedelta(days=1)
@@ -320,12 +457,12 @@ def agentic_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existin
     if existing_events:
         existing_events_context = f"""
 ### EXISTING CALENDAR EVENTS (DO NOT DOUBLE-BOOK):
-{json.dumps(existing_events, indent=2)}
+{encode_events_for_prompt(existing_events)}
 
 ⚠️  CRITICAL: The above events are ALREADY SCHEDULED. You must NOT overlap with any of these times.
 """
     
-    prompt = f"""
+    return f"""
 You are an elite AI scheduling agent with advanced optimization capabilities. You must schedule ALL the provided tasks optimally across multiple days using sophisticated reasoning.
 
 ### CURRENT CONTEXT:
@@ -333,8 +470,8 @@ You are an elite AI scheduling agent with advanced optimization capabilities. Yo
 - Current time: {today.strftime("%Y-%m-%d %H:%M:%S")} (Asia/Kolkata)
 - User's overall priority preference: {user_priority}
 
-### AVAILABLE TIME SLOTS (Multi-Day):
-{json.dumps(multi_day_slots, indent=2)}
+### AVAILABLE TIME SLOTS (Multi-Day, Asia/Kolkata, 24h HH:MM-HH:MM):
+{encode_slots_for_prompt(multi_day_slots)}
 {existing_events_context}
 ### TASKS TO SCHEDULE:
 {tasks_json}
@@ -403,14 +540,15 @@ Return ONLY valid JSON - no markdown, no explanations outside the JSON structure
 2. **RESPECT FREE SLOTS**: Only schedule within the provided available time slots
 3. **NO DOUBLE-BOOKING**: Each time slot can only have ONE task
 4. **BUFFER TIME**: Leave at least 5 minutes between tasks for transitions
+5. **TIME FORMAT**: Write start/end as YYYY-MM-DDTHH:MM in Asia/Kolkata time, without seconds or offset
 
 Required JSON structure:
 {{
   "scheduled_tasks": [
     {{
       "task_name": "string",
-      "start": "2025-07-14T09:00:00+05:30",
-      "end": "2025-07-14T10:00:00+05:30",
+      "start": "2025-07-14T09:00",
+      "end": "2025-07-14T10:00",
       "status": "on-time",
       "priority": "high",
       "reasoning": "Placed in morning for optimal focus and energy"
@@ -439,25 +577,153 @@ Required JSON structure:
 Execute your agentic scheduling intelligence now.
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an elite agentic AI scheduler with advanced optimization capabilities. You must schedule ALL tasks optimally using sophisticated global reasoning. Return ONLY valid JSON without markdown formatting."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.4  # Slightly higher for creative optimization
+def agentic_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existing_events=None):
+    """
+    Agentic AI scheduler that processes ALL tasks at once for global optimization.
+    This is the truly intelligent scheduling function that considers:
+    - All tasks holistically 
+    - Cross-task dependencies and relationships
+    - Global priority optimization
+    - Intelligent conflict resolution
+    - Energy and productivity patterns
+    """
+    prompt = generate_agentic_schedule_prompt(parsed_tasks, user_priority, multi_day_slots, existing_events)
+
+    def attempt(model):
+        with metrics.span('gpt_schedule', mode='agentic'):
+            metrics.inc(metrics.API_CALLS, api='openai', method='chat.completions')
+            response = outbound.openai_provider.call(
+                client.chat.completions.create,
+                model=model,
+                messages=[
+                    {"role": "system", "content": AGENTIC_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.4,  # Slightly higher for creative optimization
+                **_response_format_kwargs(model, 'schedule', llm_output.schedule_schema("optimization_summary"))
+            )
+        log_token_usage(f"Agentic schedule ({model})", prompt, response.usage)
+
+        return llm_output.decode_schedule(response.choices[0].message.content, "optimization_summary", decode_task_times)
+
+    # Every parsed task has to come back either scheduled or skipped
+    task_names = [task.get('task_name') for task in parsed_tasks]
+    return model_router.call_with_escalation(
+        'agentic_schedule', attempt, lambda result: llm_output.validate_schedule(result, task_names),
+        task_count=len(parsed_tasks),
+        horizon_days=len(multi_day_slots)
     )
 
-    content = response.choices[0].message.content
+class ScheduledTaskStream:
+    """
+    Incremental parser for a streamed schedule response: feed() it text chunks and it
+    returns each object of the "scheduled_tasks" array as soon as its closing brace
+    arrives, without waiting for the rest of the JSON document.
+    """
 
-    try:
-        result = extract_json_from_response(content)
-        return (
-            result.get("scheduled_tasks", []), 
-            result.get("skipped_tasks", []), 
-            result.get("optimization_summary", ""),
-            result.get("schedule_insights", [])
+    def __init__(self, key="scheduled_tasks"):
+        self.key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.buffer = ""
+        self.pos = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.object_start = None
+        self.closed = False
+
+    def feed(self, text):
+        self.buffer += text
+        objects = []
+
+        if self.pos is None:
+            match = self.key_pattern.search(self.buffer)
+            if not match:
+                return objects
+            self.pos = match.end()
+
+        while self.pos < len(self.buffer) and not self.closed:
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                if self.depth == 0:
+                    self.object_start = self.pos
+                self.depth += 1
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        objects.append(json.loads(self.buffer[self.object_start:self.pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+            elif ch == ']' and self.depth == 0:
+                self.closed = True
+            self.pos += 1
+
+        return objects
+
+def _stream_schedule_completion(system_prompt, prompt, temperature, summary_key, mode, model):
+    """
+    Streams a scheduling completion, yielding ('task', task) for each scheduled task as it is
+    decided and finally ('result', (scheduled, skipped, summary, insights)) from the full response.
+    Tasks are shown as they arrive, so a streamed response can't be escalated to another
+    model afterwards; the caller's ScheduleRepairer checks each task instead.
+    """
+    with metrics.span('gpt_schedule', mode=f"{mode}_stream"):
+        metrics.inc(metrics.API_CALLS, api='openai', method='chat.completions')
+        stream = outbound.openai_provider.call(
+            client.chat.completions.create,
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=True,
+            **_response_format_kwargs(model, 'schedule', llm_output.schedule_schema(summary_key)),
+            stream_options={"include_usage": True}
         )
-    except ValueError as e:
-        print(f"DEBUG - Agentic AI Response: {content}")
-        raise e
+
+        parser = ScheduledTaskStream()
+        content = []
+        usage = None
+
+        for chunk in stream:
+            # With include_usage the last chunk has no choices, only the token counts
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            content.append(text)
+            for task in parser.feed(text):
+                yield 'task', decode_task_times(task)
+
+        log_token_usage("Streamed schedule", prompt, usage)
+        yield 'result', llm_output.decode_schedule("".join(content), summary_key, decode_task_times)
+
+def stream_agentic_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existing_events=None):
+    """Streaming agentic_batch_schedule: yields ('task', task) as tasks are decided, then ('result', tuple)."""
+    prompt = generate_agentic_schedule_prompt(parsed_tasks, user_priority, multi_day_slots, existing_events)
+    model, _ = model_router.route('agentic_schedule_stream', task_count=len(parsed_tasks), horizon_days=len(multi_day_slots))
+    return _stream_schedule_completion(AGENTIC_SYSTEM_PROMPT, prompt, 0.4, "optimization_summary", "agentic", model)
+
+def stream_ai_schedule_tasks(user_input, user_priority, multi_day_slots, existing_events=None):
+    """Streaming ai_schedule_tasks: yields ('task', task) as tasks are decided, then ('result', tuple)."""
+    prompt = generate_ai_schedule_prompt(user_input, user_priority, multi_day_slots, existing_events)
+    model, _ = model_router.route(
+        'fused_schedule_stream',
+        input_chars=len(user_input),
+        task_count=model_router.estimate_task_count(user_input),
+        horizon_days=len(multi_day_slots)
+    )
+    return _stream_schedule_completion(AI_SCHEDULE_SYSTEM_PROMPT, prompt, 0.3, "reasoning_logs", "fused", model)
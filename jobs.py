@@ -0,0 +1,158 @@
+"""
+Background job queue for scheduling requests.
+
+Runs the whole pipeline (parse -> availability -> schedule -> insert) on a bounded
+worker pool so web workers can return a job ID immediately and clients poll for results
+or follow the job's progress events as a stream.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import stream_scheduling_pipeline
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_MAX_PER_USER = int(os.getenv("JOB_MAX_PER_USER", "2"))
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+# A job stream sends a keep-alive after this long without progress, and ends after
+# JOB_STREAM_MAX_SECONDS so it never holds a web worker for the whole job; clients reconnect
+JOB_STREAM_KEEPALIVE_SECONDS = float(os.getenv("JOB_STREAM_KEEPALIVE_SECONDS", "15"))
+JOB_STREAM_MAX_SECONDS = float(os.getenv("JOB_STREAM_MAX_SECONDS", "120"))
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="scheduling-job")
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+# Notified whenever a job records a progress event or finishes
+_jobs_changed = threading.Condition(_jobs_lock)
+
+class TooManyJobsError(Exception):
+    """Raised when a user already has JOB_MAX_PER_USER jobs queued or running."""
+
+def _prune_finished_jobs(now):
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job['finished_at'] is not None and now - job['finished_at'] > JOB_RESULT_TTL_SECONDS
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def submit_scheduling_job(user, user_input, user_priority, pipeline='agentic'):
+    """
+    Queues a scheduling request and returns its job ID straight away.
+    Raises TooManyJobsError if the user is already at their concurrency limit.
+    """
+    now = time.time()
+
+    with _jobs_lock:
+        _prune_finished_jobs(now)
+        active = sum(1 for job in _jobs.values() if job['user'] == user and job['status'] in ('queued', 'running'))
+        if active >= JOB_MAX_PER_USER:
+            raise TooManyJobsError(f"You already have {active} scheduling request(s) in progress")
+
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            'id': job_id,
+            'user': user,
+            'status': 'queued',
+            'stage': None,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'result': {'scheduled_tasks': [], 'inserted': [], 'skipped_tasks': [], 'optimization_summary': "", 'schedule_insights': []},
+            'events': [],  # every (event, data) pair from the pipeline, for job_events
+            'error': None,
+        }
+
+    job_executor.submit(_run_job, job_id, user, user_input, user_priority, pipeline)
+    return job_id
+
+def _run_job(job_id, user, user_input, user_priority, pipeline):
+    with _jobs_lock:
+        job = _jobs[job_id]
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+
+    try:
+        for event, data in stream_scheduling_pipeline(user, user_input, user_priority, pipeline):
+            with _jobs_changed:
+                job['events'].append((event, data))
+                _jobs_changed.notify_all()
+                result = job['result']
+                if event == 'status':
+                    job['stage'] = data['message']
+                elif event == 'task':
+                    result['scheduled_tasks'].append(data)
+                elif event == 'inserted':
+                    result['inserted'].append(data)
+                elif event == 'skipped':
+                    result['skipped_tasks'].append(data)
+                elif event == 'summary':
+                    result.update(data)
+        status, error = 'done', None
+    except Exception as e:
+        print(f"DEBUG: Job {job_id} failed: {e}")
+        status, error = 'failed', str(e)
+
+    with _jobs_changed:
+        if error is not None:
+            job['events'].append(('error', {'message': error}))
+        job['status'] = status
+        job['error'] = error
+        job['finished_at'] = time.time()
+        _jobs_changed.notify_all()
+
+def get_job(job_id, user):
+    """Returns a snapshot of the job, or None if it doesn't exist or belongs to another user."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job['user'] != user:
+            return None
+        snapshot = dict(job, result={key: list(value) if isinstance(value, list) else value for key, value in job['result'].items()})
+
+    del snapshot['user']
+    del snapshot['events']
+    return snapshot
+
+def job_events(job_id, user, start=0, keepalive_seconds=JOB_STREAM_KEEPALIVE_SECONDS, max_seconds=JOB_STREAM_MAX_SECONDS):
+    """
+    Yields the job's progress as (index, event, data), starting at event number `start`, and
+    waits for new ones until the job has finished, which is marked by (None, 'done', {}).
+    A failed job's last event is ('error', {'message'}).
+    While there is no progress, (None, 'keepalive', None) is yielded every keepalive_seconds.
+    After max_seconds the generator returns even if the job is still running; the caller
+    resumes with start set to one past the last index it received.
+    Yields nothing if the job doesn't exist or belongs to another user.
+    """
+    sent = start
+    last_sent = time.monotonic()
+    deadline = last_sent + max_seconds
+
+    while True:
+        with _jobs_changed:
+            job = _jobs.get(job_id)
+            if job is None or job['user'] != user:
+                return
+            if sent >= len(job['events']) and job['finished_at'] is None:
+                # Woken by any job's progress, so the timeout is checked again below
+                _jobs_changed.wait(max(0, min(last_sent + keepalive_seconds, deadline) - time.monotonic()))
+            new_events = job['events'][sent:]
+            finished = job['finished_at'] is not None
+
+        for index, (event, data) in enumerate(new_events, sent):
+            yield index, event, data
+        sent += len(new_events)
+        if finished:
+            yield None, 'done', {}
+            return
+
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        if new_events:
+            last_sent = now
+        elif now - last_sent >= keepalive_seconds:
+            yield None, 'keepalive', None
+            last_sent = now
@@ -0,0 +1,193 @@
+"""
+Structured output for the GPT calls: JSON schemas for parsed tasks and schedules, the
+response_format that asks the API to enforce them, and a single decode-and-validate pass
+that turns a response into task dicts / a ScheduleResult.
+"""
+import json
+import os
+from typing import NamedTuple
+
+import metrics
+from models import parse_minutes
+
+# "auto" uses JSON-schema structured output on models that support it and JSON mode on
+# models that only support that; "off" relies on the prompt alone
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "auto")
+STRUCTURED_OUTPUT_MODEL_PREFIXES = ('gpt-4o', 'gpt-4.1', 'gpt-5', 'o1', 'o3', 'o4')
+JSON_MODE_MODEL_PREFIXES = ('gpt-4-turbo', 'gpt-4-1106', 'gpt-4-0125', 'gpt-3.5-turbo')
+
+PRIORITIES = ['high', 'medium', 'low']
+
+_nullable_string = {"type": ["string", "null"]}
+
+PARSED_TASKS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "task_name": {"type": "string"},
+                    "duration": {"type": "integer", "description": "minutes"},
+                    "start_time": dict(_nullable_string, description="ISO 8601 with offset; null unless fixed"),
+                    "deadline": {"type": "string", "description": "ISO 8601 with offset"},
+                    "priority": {"type": "string", "enum": PRIORITIES},
+                    "fixed": {"type": "boolean"},
+                    "date": {"type": "string", "description": "YYYY-MM-DD"},
+                },
+                "required": ["task_name", "duration", "start_time", "deadline", "priority", "fixed", "date"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["tasks"],
+    "additionalProperties": False,
+}
+
+def schedule_schema(summary_key):
+    """Schedule response schema; the fused prompt calls its summary reasoning_logs, the agentic one optimization_summary."""
+    return {
+        "type": "object",
+        "properties": {
+            # scheduled_tasks comes first so streamed tasks arrive before the summary
+            "scheduled_tasks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "task_name": {"type": "string"},
+                        "start": {"type": "string", "description": "YYYY-MM-DDTHH:MM, Asia/Kolkata"},
+                        "end": {"type": "string", "description": "YYYY-MM-DDTHH:MM, Asia/Kolkata"},
+                        "status": {"type": "string", "enum": ["on-time", "late"]},
+                        "priority": {"type": "string", "enum": PRIORITIES},
+                        "reasoning": {"type": "string"},
+                    },
+                    "required": ["task_name", "start", "end", "status", "priority", "reasoning"],
+                    "additionalProperties": False,
+                },
+            },
+            "skipped_tasks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "task_name": {"type": "string"},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["task_name", "reason"],
+                    "additionalProperties": False,
+                },
+            },
+            summary_key: {"type": "string"},
+            "schedule_insights": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["scheduled_tasks", "skipped_tasks", summary_key, "schedule_insights"],
+        "additionalProperties": False,
+    }
+
+def response_format(model, name, schema):
+    """The response_format argument for this model, or None if it has no JSON output mode."""
+    if STRUCTURED_OUTPUT == 'off':
+        return None
+    if model.startswith(STRUCTURED_OUTPUT_MODEL_PREFIXES):
+        return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+    if model.startswith(JSON_MODE_MODEL_PREFIXES):
+        return {"type": "json_object"}
+    return None
+
+class ScheduleResult(NamedTuple):
+    """A decoded schedule response; unpacks like the old (scheduled, skipped, summary, insights) tuple."""
+    scheduled_tasks: list
+    skipped_tasks: list
+    summary: str
+    insights: list
+
+def decode_json(content):
+    """
+    One json.loads of the response. Structured output guarantees plain JSON; for models
+    without it, a surrounding ```json fence is the one deviation that is tolerated.
+    Raises ValueError if the content isn't JSON.
+    """
+    content = (content or "").strip()
+    if content.startswith("```"):
+        metrics.inc(metrics.JSON_FALLBACKS, outcome='code_fence')
+        content = content.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        metrics.inc(metrics.JSON_FALLBACKS, outcome='failed')
+        print(f"DEBUG - AI Response Content:\n{content}")
+        raise ValueError(f"AI response was not valid JSON ({e})")
+
+def decode_parsed_tasks(content):
+    """Decodes a parse response ({"tasks": [...]}, or a bare array from prompt-only models) into task dicts."""
+    data = decode_json(content)
+    tasks = data.get('tasks') if isinstance(data, dict) else data
+    if not isinstance(tasks, list):
+        raise ValueError("AI response did not contain a list of tasks")
+    # Strict schemas send null for "not set"; downstream code expects the key to be absent
+    return [{key: value for key, value in task.items() if value is not None} if isinstance(task, dict) else task for task in tasks]
+
+def decode_schedule(content, summary_key, decode_times):
+    """Decodes a schedule response into a ScheduleResult, expanding task times with decode_times."""
+    data = decode_json(content)
+    if not isinstance(data, dict):
+        raise ValueError("AI response was not a JSON object")
+    scheduled = data.get("scheduled_tasks") or []
+    skipped = data.get("skipped_tasks") or []
+    if not isinstance(scheduled, list) or not isinstance(skipped, list):
+        raise ValueError("scheduled_tasks and skipped_tasks must be arrays")
+    return ScheduleResult(
+        [decode_times(task) if isinstance(task, dict) else task for task in scheduled],
+        skipped,
+        data.get(summary_key, ""),
+        data.get("schedule_insights") or []
+    )
+
+def validate_parsed_tasks(tasks):
+    """Raises ValueError unless tasks is a list of task objects in the parse schema."""
+    if not isinstance(tasks, list):
+        raise ValueError("expected a JSON array of tasks")
+    for task in tasks:
+        if not isinstance(task, dict) or not task.get('task_name'):
+            raise ValueError("task without a task_name")
+        try:
+            if int(task.get('duration', 60)) <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"'{task['task_name']}' has an invalid duration")
+        for key in ('deadline', 'start_time'):
+            if task.get(key):
+                try:
+                    parse_minutes(task[key])
+                except (TypeError, ValueError):
+                    raise ValueError(f"'{task['task_name']}' has an invalid {key}")
+        if task.get('fixed') and not task.get('start_time'):
+            raise ValueError(f"'{task['task_name']}' is fixed but has no start_time")
+
+def validate_schedule(result, task_names=None):
+    """
+    Raises ValueError unless result is a well-formed (scheduled, skipped, summary, insights)
+    schedule; with task_names, each of those tasks must be either scheduled or skipped.
+    """
+    scheduled, skipped = result[0], result[1]
+    for task in scheduled:
+        if not isinstance(task, dict) or not task.get('task_name'):
+            raise ValueError("scheduled task without a task_name")
+        try:
+            start = parse_minutes(task['start'])
+            end = parse_minutes(task['end'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"'{task['task_name']}' has an invalid start/end time")
+        if end <= start:
+            raise ValueError(f"'{task['task_name']}' ends before it starts")
+    for task in skipped:
+        if not isinstance(task, dict) or not task.get('task_name'):
+            raise ValueError("skipped task without a task_name")
+
+    if task_names:
+        returned = {task['task_name'] for task in scheduled} | {task['task_name'] for task in skipped}
+        missing = [name for name in task_names if name not in returned]
+        if missing:
+            raise ValueError(f"tasks missing from the response: {', '.join(missing)}")
@@ -0,0 +1,128 @@
+"""
+In-process metrics: per-stage timing spans, counters and a Prometheus text exporter.
+
+Stages are timed with `with span('gpt_parse'):` and land in one latency histogram
+labelled by stage, so p50/p99 per stage can be read off /metrics with histogram_quantile.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from in-memory work up to slow GPT completions
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_DURATION = 'scheduler_stage_duration_seconds'
+STAGE_ERRORS = 'scheduler_stage_errors_total'
+API_CALLS = 'scheduler_api_calls_total'
+LLM_TOKENS = 'scheduler_llm_tokens_total'
+RETRIES = 'scheduler_retries_total'
+API_THROTTLED = 'scheduler_api_throttled_total'
+TOKEN_REFRESHES = 'scheduler_oauth_token_refreshes_total'
+MODEL_ROUTES = 'scheduler_model_routes_total'
+MODEL_ESCALATIONS = 'scheduler_model_escalations_total'
+JSON_FALLBACKS = 'scheduler_json_extraction_fallbacks_total'
+
+HELP = {
+    STAGE_DURATION: "Time spent in each request stage",
+    STAGE_ERRORS: "Stages that ended with an exception",
+    API_CALLS: "Outbound calls to Google Calendar and OpenAI",
+    LLM_TOKENS: "Prompt and completion tokens reported by OpenAI",
+    RETRIES: "Operations that had to be retried",
+    API_THROTTLED: "Outbound calls refused locally by the rate limiter or an open circuit breaker",
+    TOKEN_REFRESHES: "OAuth access token refreshes, and callers that reused a concurrent refresh",
+    MODEL_ROUTES: "GPT calls by the model route they were sent to first",
+    MODEL_ESCALATIONS: "Small-model results that failed validation and were redone on the large model",
+    JSON_FALLBACKS: "Model responses that needed a fallback to extract JSON",
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+_collectors = []  # (name, type, help, fn) where fn() returns [(labels dict, value)]
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name, amount=1, **labels):
+    """Adds amount to the counter name{labels}."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, **labels):
+    """Records one value (in seconds) in the histogram name{labels}."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        buckets = _histograms.get(key)
+        if buckets is None:
+            buckets = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        buckets[len(LATENCY_BUCKETS)] += 1
+        buckets[-1] += value
+
+@contextmanager
+def span(stage, **labels):
+    """Times the enclosed block as one `stage` and logs it as a structured line."""
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception:
+        status = 'error'
+        inc(STAGE_ERRORS, stage=stage, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(STAGE_DURATION, elapsed, stage=stage, **labels)
+        extra = "".join(f" {key}={value}" for key, value in labels.items())
+        print(f"DEBUG: span stage={stage}{extra} status={status} duration_ms={elapsed * 1000:.1f}")
+
+def register_collector(name, metric_type, help_text, fn):
+    """Exports values computed at scrape time, e.g. cache statistics kept elsewhere."""
+    _collectors.append((name, metric_type, help_text, fn))
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), buckets in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {buckets[len(LATENCY_BUCKETS)]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {buckets[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {buckets[len(LATENCY_BUCKETS)]}")
+
+    for name, metric_type, help_text, fn in _collectors:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in fn():
+            lines.append(f"{name}{_format_labels(_labels_key(labels))} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,65 @@
+"""
+Model routing for the GPT calls.
+
+Small requests (short input, few tasks, short horizon) go to a cheaper, faster model.
+Its output is validated, and only when validation fails is the call repeated on the
+large model. Route counts, per-route latency and escalations are exported on /metrics
+so the thresholds can be tuned.
+"""
+import os
+import re
+
+import metrics
+
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER_ENABLED", "1") == "1"
+ROUTER_SMALL_MODEL = os.getenv("ROUTER_SMALL_MODEL", "gpt-4o-mini")
+ROUTER_LARGE_MODEL = os.getenv("ROUTER_LARGE_MODEL", "gpt-4o")
+# A request takes the small route only if it is within all of these
+ROUTER_SMALL_MAX_INPUT_CHARS = int(os.getenv("ROUTER_SMALL_MAX_INPUT_CHARS", "400"))
+ROUTER_SMALL_MAX_TASKS = int(os.getenv("ROUTER_SMALL_MAX_TASKS", "4"))
+ROUTER_SMALL_MAX_HORIZON_DAYS = int(os.getenv("ROUTER_SMALL_MAX_HORIZON_DAYS", "3"))
+
+_TASK_SEPARATOR = re.compile(r'[;\n]+|[.,](?!\d)|\band then\b|\bthen\b|\balso\b')
+
+def estimate_task_count(user_input):
+    """Rough number of tasks in free text: one per clause."""
+    return max(1, sum(1 for clause in _TASK_SEPARATOR.split(user_input or "") if clause.strip()))
+
+def route(call, input_chars=None, task_count=None, horizon_days=None):
+    """Picks the model for one call. Returns (model, route) with route 'small' or 'large'."""
+    small = MODEL_ROUTER_ENABLED and (
+        (input_chars is None or input_chars <= ROUTER_SMALL_MAX_INPUT_CHARS)
+        and (task_count is None or task_count <= ROUTER_SMALL_MAX_TASKS)
+        and (horizon_days is None or horizon_days <= ROUTER_SMALL_MAX_HORIZON_DAYS)
+    )
+    chosen = 'small' if small else 'large'
+    metrics.inc(metrics.MODEL_ROUTES, call=call, route=chosen)
+    return (ROUTER_SMALL_MODEL if small else ROUTER_LARGE_MODEL), chosen
+
+def call_with_escalation(call, attempt, validate, **features):
+    """
+    Runs attempt(model) on the routed model and checks the result with validate(result),
+    which raises ValueError on bad output. A small-model result that can't be parsed or
+    fails validation is thrown away and the call is made again on the large model.
+    Large-model output is returned even if it fails validation, as before routing existed;
+    the schedule repair step downstream still checks every placement.
+    """
+    model, chosen = route(call, **features)
+    if chosen == 'small':
+        try:
+            with metrics.span('llm_call', call=call, route=chosen):
+                result = attempt(model)
+            validate(result)
+            return result
+        except ValueError as e:
+            metrics.inc(metrics.MODEL_ESCALATIONS, call=call)
+            print(f"DEBUG: {call} output from {model} failed validation ({e}); escalating to {ROUTER_LARGE_MODEL}")
+        chosen = 'escalated'
+
+    with metrics.span('llm_call', call=call, route=chosen):
+        result = attempt(ROUTER_LARGE_MODEL)
+    try:
+        validate(result)
+    except ValueError as e:
+        print(f"DEBUG: {call} output from {ROUTER_LARGE_MODEL} failed validation ({e}); using it anyway")
+    return result
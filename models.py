@@ -0,0 +1,172 @@
+"""
+Shared model layer for tasks, free slots and calendar events.
+
+Times are stored as integer epoch minutes plus a reference to the timezone they are shown
+in, instead of ISO strings. ISO strings are parsed once where data comes in (Calendar API,
+model output, slot dicts) and formatted once where it goes out, so the slot-manipulation
+loops in between only compare and add integers.
+"""
+from datetime import datetime
+import pytz
+
+TIMEZONE = pytz.timezone("Asia/Kolkata")
+DEFAULT_DURATION_MINUTES = 60
+DEFAULT_DEADLINE_HOUR = 22
+PRIORITIES = ('high', 'medium', 'low')
+
+def to_minutes(dt, tz=TIMEZONE):
+    """Epoch minutes of a datetime; naive datetimes are taken to be in tz."""
+    if dt.tzinfo is None:
+        dt = tz.localize(dt)
+    return int(dt.timestamp()) // 60
+
+def to_datetime(minutes, tz=TIMEZONE):
+    return datetime.fromtimestamp(minutes * 60, tz)
+
+def parse_minutes(value, tz=TIMEZONE):
+    """Epoch minutes of an ISO 8601 string. Raises ValueError/TypeError if it isn't one."""
+    return to_minutes(datetime.fromisoformat(value), tz)
+
+def format_minutes(minutes, tz=TIMEZONE):
+    return to_datetime(minutes, tz).isoformat()
+
+def now_minutes():
+    return int(datetime.now().timestamp()) // 60
+
+def day_key(minutes, tz=TIMEZONE):
+    """The "YYYY-MM-DD" local date a minute falls on."""
+    return to_datetime(minutes, tz).strftime("%Y-%m-%d")
+
+def at_hour(minutes, hour, tz=TIMEZONE):
+    """Epoch minutes of hour:00 local time on the day `minutes` falls on."""
+    return to_minutes(to_datetime(minutes, tz).replace(hour=hour, minute=0, tzinfo=None), tz)
+
+def deadline_minutes(value, tz=TIMEZONE, fallback_hour=DEFAULT_DEADLINE_HOUR):
+    """Epoch minutes of a deadline; invalid/missing deadlines fall back to today at 10 PM."""
+    try:
+        return parse_minutes(value, tz)
+    except (TypeError, ValueError):
+        return at_hour(now_minutes(), fallback_hour, tz)
+
+class Slot:
+    """A [start, end) span of free or busy time."""
+    __slots__ = ('start', 'end', 'tz')
+
+    def __init__(self, start, end, tz=TIMEZONE):
+        self.start = start
+        self.end = end
+        self.tz = tz
+
+    @classmethod
+    def from_dict(cls, slot, tz=TIMEZONE):
+        """From the {'start', 'end'} ISO shape used by calendar_api and freebusy."""
+        return cls(parse_minutes(slot['start'], tz), parse_minutes(slot['end'], tz), tz)
+
+    def to_dict(self):
+        return {'start': format_minutes(self.start, self.tz), 'end': format_minutes(self.end, self.tz)}
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"Slot({format_minutes(self.start, self.tz)}, {format_minutes(self.end, self.tz)})"
+
+class Event:
+    """An existing calendar event, as used for busy time and the AI's events context."""
+    __slots__ = ('summary', 'start', 'end', 'all_day', 'tz')
+
+    def __init__(self, summary, start, end, all_day=False, tz=TIMEZONE):
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+        self.tz = tz
+
+    @classmethod
+    def from_api(cls, event, tz=TIMEZONE):
+        """From a Calendar API event resource; None if it has neither dateTime nor date."""
+        start, end = event.get('start', {}), event.get('end', {})
+        summary = event.get('summary', 'Untitled Event')
+        if 'dateTime' in start:
+            return cls(summary, parse_minutes(start['dateTime'], tz), parse_minutes(end['dateTime'], tz), False, tz)
+        if 'date' in start:
+            # All-day events span whole local days
+            return cls(summary, parse_minutes(start['date'], tz), parse_minutes(end['date'], tz), True, tz)
+        return None
+
+    @classmethod
+    def from_dict(cls, event, tz=TIMEZONE):
+        """From the events-context shape produced by to_dict."""
+        return cls(event.get('summary', 'Untitled Event'), parse_minutes(event['start'], tz), parse_minutes(event['end'], tz), False, tz)
+
+    @property
+    def date(self):
+        return day_key(self.start, self.tz)
+
+    def to_dict(self):
+        start = to_datetime(self.start, self.tz)
+        end = to_datetime(self.end, self.tz)
+        return {
+            'summary': self.summary,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'start_time': start.strftime("%H:%M"),
+            'end_time': end.strftime("%H:%M")
+        }
+
+class Task:
+    """
+    A task to schedule, normalized from the parse schema: duration in minutes, deadline
+    and (for fixed tasks) start_time in epoch minutes.
+    """
+    __slots__ = ('task_name', 'duration', 'deadline', 'priority', 'start_time', 'not_before', 'tz')
+
+    def __init__(self, task_name, duration, deadline, priority='medium', start_time=None, tz=TIMEZONE):
+        self.task_name = task_name
+        self.duration = duration
+        self.deadline = deadline
+        self.priority = priority
+        self.start_time = start_time
+        # Earliest allowed start, for fixed tasks whose requested time was taken
+        self.not_before = None
+        self.tz = tz
+
+    @classmethod
+    def from_dict(cls, task, user_priority=None, tz=TIMEZONE):
+        """From a parsed task dict, filling in defaults the way the schedulers always have."""
+        try:
+            duration = int(task.get('duration') or DEFAULT_DURATION_MINUTES)
+        except (TypeError, ValueError):
+            duration = DEFAULT_DURATION_MINUTES
+
+        priority = str(task.get('priority') or user_priority or 'medium').lower()
+        if priority not in PRIORITIES:
+            priority = 'medium'
+
+        start_time = None
+        if task.get('fixed') and task.get('start_time'):
+            try:
+                start_time = parse_minutes(task['start_time'], tz)
+            except (TypeError, ValueError):
+                start_time = None
+
+        return cls(
+            task.get('task_name', 'Untitled task'),
+            duration,
+            deadline_minutes(task.get('deadline'), tz),
+            priority,
+            start_time,
+            tz
+        )
+
+    def placement(self, start, status, reasoning):
+        """The scheduled-task dict for this task placed at `start`."""
+        return {
+            'task_name': self.task_name,
+            'start': format_minutes(start, self.tz),
+            'end': format_minutes(start + self.duration, self.tz),
+            'status': status,
+            'priority': self.priority,
+            'reasoning': reasoning
+        }
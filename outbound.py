@@ -0,0 +1,223 @@
+"""
+Shared layer for outbound API calls (Google Calendar, OpenAI).
+
+Every call goes through a per-provider Provider, which
+- waits for a token from a token bucket, so bursts are smoothed to the provider's quota,
+- retries 429/5xx/connection errors with jittered exponential backoff, honouring Retry-After,
+- trips a circuit breaker after repeated failures, so an unhealthy provider fails fast
+  instead of being hammered harder.
+"""
+import os
+import random
+import threading
+import time
+
+import metrics
+
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "4"))
+OUTBOUND_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_BASE_SECONDS", "0.5"))
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_MAX_SECONDS", "30"))
+# Longest a call waits for a rate-limit token before giving up
+OUTBOUND_MAX_WAIT_SECONDS = float(os.getenv("OUTBOUND_MAX_WAIT_SECONDS", "30"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("OUTBOUND_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("OUTBOUND_BREAKER_RESET_SECONDS", "30"))
+
+class RateLimitedError(Exception):
+    """Raised when no rate-limit token became available within OUTBOUND_MAX_WAIT_SECONDS."""
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while its circuit breaker is open."""
+
+def error_status(exc):
+    """HTTP status of an API error from googleapiclient (resp.status) or openai (status_code), else None."""
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'resp', None), 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_seconds(exc):
+    """The Retry-After header of an API error in seconds, if it sent one."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or getattr(exc, 'resp', None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get('retry-after') or headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limited(exc):
+    """429, or Google's 403 rateLimitExceeded/userRateLimitExceeded; the request was not carried out."""
+    status = error_status(exc)
+    return status == 429 or (status == 403 and 'ratelimitexceeded' in str(exc).lower())
+
+def is_retryable(exc):
+    """Rate limits, 5xx and connection-level failures are worth retrying; other 4xx are not."""
+    status = error_status(exc)
+    if status is not None:
+        return is_rate_limited(exc) or status >= 500
+    # openai's APIConnectionError/APITimeoutError and raw socket/httplib2 failures carry no status
+    return isinstance(exc, (ConnectionError, TimeoutError, OSError)) or type(exc).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `burst` calls."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.waiting += 1
+        try:
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate
+                if now + wait > deadline:
+                    return False
+                time.sleep(wait)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls; while open every call fails fast.
+    After `reset_seconds` one trial call is let through (half-open): success closes
+    the breaker again, failure re-opens it.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+
+    def retry_in(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            return max(0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+class Provider:
+    """Rate limit, retry policy and circuit breaker for one outbound API."""
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+    def backoff_seconds(self, attempt, exc=None):
+        """Full-jitter exponential backoff, or the server's Retry-After if it asked for longer."""
+        delay = random.uniform(0, min(OUTBOUND_BACKOFF_MAX_SECONDS, OUTBOUND_BACKOFF_BASE_SECONDS * 2 ** attempt))
+        retry_after = retry_after_seconds(exc) if exc is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, OUTBOUND_BACKOFF_MAX_SECONDS))
+        return delay
+
+    def call(self, fn, *args, idempotent=True, **kwargs):
+        """
+        Calls fn(*args, **kwargs) under this provider's rate limit, retrying retryable
+        errors up to OUTBOUND_MAX_RETRIES times. Non-idempotent calls (e.g. inserts)
+        are only retried on rate-limit errors, which the server rejects before doing any work.
+        The breaker counts one failure per call, once its retries are used up, so a single
+        call retrying through a few 503s can't open it on its own.
+        """
+        for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+            # Don't queue for a token just to be refused by an open breaker afterwards
+            if self.breaker.state != 'open' and not self.bucket.acquire(OUTBOUND_MAX_WAIT_SECONDS):
+                metrics.inc(metrics.API_THROTTLED, provider=self.name, reason='rate_limit')
+                raise RateLimitedError(f"{self.name} API rate limit: no capacity within {OUTBOUND_MAX_WAIT_SECONDS:.0f}s")
+            if not self.breaker.allow():
+                metrics.inc(metrics.API_THROTTLED, provider=self.name, reason='circuit_open')
+                raise CircuitOpenError(
+                    f"{self.name} API is failing; not calling it for another {self.breaker.retry_in():.1f}s"
+                )
+            # Let through while half-open: this attempt is the breaker's trial call
+            trial = self.breaker.state == 'half_open'
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The provider answered; a 4xx says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                if attempt == OUTBOUND_MAX_RETRIES or (not idempotent and not is_rate_limited(e)) or trial:
+                    # A failed trial re-opens the breaker straight away instead of retrying
+                    self.breaker.record_failure()
+                    raise
+                delay = self.backoff_seconds(attempt, e)
+                metrics.inc(metrics.RETRIES, operation=self.name, status=error_status(e) or 'connection')
+                print(f"DEBUG: {self.name} call failed ({e}); retry {attempt + 1}/{OUTBOUND_MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+calendar_provider = Provider(
+    'calendar',
+    rate=float(os.getenv("CALENDAR_RATE_PER_SECOND", "10")),
+    burst=int(os.getenv("CALENDAR_RATE_BURST", "20"))
+)
+openai_provider = Provider(
+    'openai',
+    rate=float(os.getenv("OPENAI_RATE_PER_SECOND", "3")),
+    burst=int(os.getenv("OPENAI_RATE_BURST", "10"))
+)
+
+PROVIDERS = (calendar_provider, openai_provider)
+
+metrics.register_collector(
+    'scheduler_outbound_queue_depth', 'gauge', "Calls waiting for a rate-limit token",
+    lambda: [({'provider': provider.name}, provider.bucket.waiting) for provider in PROVIDERS]
+)
+metrics.register_collector(
+    'scheduler_outbound_circuit_open', 'gauge', "1 while the provider's circuit breaker is open",
+    lambda: [({'provider': provider.name}, int(provider.breaker.state == 'open')) for provider in PROVIDERS]
+)
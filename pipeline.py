@@ -0,0 +1,149 @@
+"""
+Scheduling request pipeline: runs the independent stages of a request concurrently.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from datetime import datetime
+
+import metrics
+from calendar_api import analyze_user_input_for_date_range, event_id_for, get_availability, insert_event
+from gpt_parser import parse_tasks_with_gpt, stream_agentic_batch_schedule, stream_ai_schedule_tasks
+from quick_parser import parse_tasks_locally
+from scheduler import ScheduleRepairer, local_batch_schedule
+
+# Shared, bounded pool for the I/O-bound stages of every request (calendar fetches, GPT parse)
+STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "16"))
+STAGE_TIMEOUT_SECONDS = float(os.getenv("PIPELINE_STAGE_TIMEOUT_SECONDS", "120"))
+# Inputs the rule-based parser handles at least this confidently skip the GPT parse
+QUICK_PARSE_MIN_CONFIDENCE = float(os.getenv("QUICK_PARSE_MIN_CONFIDENCE", "0.8"))
+
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="pipeline-stage")
+
+def run_concurrently(stages, timeout=STAGE_TIMEOUT_SECONDS):
+    """
+    Runs {name: (fn, *args)} on the stage pool and returns {name: result}.
+    As soon as one stage fails, stages that haven't started are cancelled and
+    that stage's exception is re-raised; the same happens on timeout.
+    A stage that is already running can't be interrupted: it keeps its stage worker
+    until it returns, which its own API timeouts and outbound retry limits bound.
+    """
+    futures = {name: stage_executor.submit(fn, *args) for name, (fn, *args) in stages.items()}
+    done, pending = wait(futures.values(), timeout=timeout, return_when=FIRST_EXCEPTION)
+
+    for name, future in futures.items():
+        if future in done and future.exception() is not None:
+            for other in pending:
+                other.cancel()
+            raise future.exception()
+
+    if pending:
+        for other in pending:
+            other.cancel()
+        unfinished = ", ".join(name for name, future in futures.items() if future in pending)
+        raise TimeoutError(f"Pipeline stages timed out after {timeout}s: {unfinished}")
+
+    return {name: future.result() for name, future in futures.items()}
+
+def parse_tasks(user_input, user_priority):
+    """Parses with the local rule-based parser when it is confident enough, otherwise with GPT."""
+    tasks, confidence = parse_tasks_locally(user_input, user_priority)
+    if confidence >= QUICK_PARSE_MIN_CONFIDENCE:
+        print(f"DEBUG: Quick parser handled input (confidence {confidence:.2f}), skipping GPT parse")
+        return tasks
+
+    print(f"DEBUG: Quick parser confidence {confidence:.2f}, falling back to GPT parse")
+    return parse_tasks_with_gpt(user_input, user_priority)
+
+def fetch_scheduling_inputs(user, user_input, user_priority, parse=True):
+    """
+    Fetches availability (free slots and existing events, from a single events listing) and,
+    if parse is set, the GPT task parse in parallel, so the request waits for the slowest
+    stage instead of the sum of them.
+    Returns (multi_day_slots, existing_events, parsed_tasks); parsed_tasks is None when parse is off.
+    """
+    with metrics.span('date_range'):
+        start_date, num_days = analyze_user_input_for_date_range(user_input) if user_input else (datetime.now(), 3)
+    print(f"Analyzed user input: optimized to {num_days} day(s) starting from {start_date.strftime('%Y-%m-%d')}")
+
+    stages = {
+        'availability': (get_availability, user, start_date, num_days),
+    }
+    if parse:
+        stages['parsed_tasks'] = (parse_tasks, user_input, user_priority)
+
+    results = run_concurrently(stages)
+    multi_day_slots, existing_events = results['availability']
+    return multi_day_slots, existing_events, results.get('parsed_tasks')
+
+def _finished_inserts(inserts, block=False):
+    """Pops insert futures that are done (all of them if block is set) and yields 'inserted' events."""
+    if block and inserts:
+        wait(list(inserts))
+    for future in [f for f in inserts if f.done()]:
+        task = inserts.pop(future)
+        try:
+            link, error = future.result(), None
+        except Exception as e:
+            link, error = None, str(e)
+        yield 'inserted', {'task_name': task['task_name'], 'start': task['start'], 'link': link, 'error': error}
+
+def stream_scheduling_pipeline(user, user_input, user_priority, pipeline='agentic', insert=True, event_key=None):
+    """
+    Runs the whole request (availability + parse, schedule, validate, insert) as a generator of
+    (event, data) pairs, so results can be pushed to the browser while work is still going on:
+    'status', 'task' (a task was decided), 'inserted' (its calendar link or error),
+    'skipped', and a final 'summary'. Each task is inserted as soon as it is decided,
+    while the model is still generating the rest of the schedule.
+    With insert=False (dry run) nothing is written to the calendar and no 'inserted' events are sent.
+    event_key gives the inserted events deterministic IDs (see calendar_api.insert_event), so
+    running the same request again doesn't insert its tasks twice. An ID depends on the key,
+    the task name and how many tasks of that name came before it, not on the start time, which
+    a rerun may well choose differently.
+    """
+    yield 'status', {'message': "Reading your calendar and understanding your tasks..."}
+    multi_day_slots, existing_events, parsed_tasks = fetch_scheduling_inputs(
+        user, user_input, user_priority, parse=(pipeline != 'fused')
+    )
+
+    yield 'status', {'message': "Scheduling..."}
+    if pipeline == 'fused':
+        decisions = stream_ai_schedule_tasks(user_input, user_priority, multi_day_slots, existing_events)
+    elif pipeline == 'local':
+        result = local_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existing_events)
+        decisions = [('task', task) for task in result[0]] + [('result', result)]
+    else:
+        decisions = stream_agentic_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existing_events)
+
+    repairer = ScheduleRepairer(multi_day_slots, existing_events, parsed_tasks)
+    inserts = {}
+    name_counts = {}
+    repairs = []
+    optimization_summary, schedule_insights = "", []
+
+    for kind, payload in decisions:
+        if kind == 'task':
+            task, skipped_task, note = repairer.repair(payload)
+            if note:
+                repairs.append(note)
+            if task is None:
+                yield 'skipped', skipped_task
+            else:
+                yield 'task', task
+                if insert:
+                    occurrence = name_counts.get(task['task_name'], 0)
+                    name_counts[task['task_name']] = occurrence + 1
+                    event_id = event_id_for(event_key, task['task_name'], occurrence) if event_key else None
+                    inserts[stage_executor.submit(insert_event, user, task, event_id)] = task
+        else:
+            _, skipped_tasks, optimization_summary, schedule_insights = payload
+            for skipped_task in skipped_tasks:
+                yield 'skipped', skipped_task
+
+        yield from _finished_inserts(inserts)
+
+    yield from _finished_inserts(inserts, block=True)
+
+    yield 'summary', {
+        'optimization_summary': optimization_summary,
+        'schedule_insights': list(schedule_insights or []) + repairs
+    }
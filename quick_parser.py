@@ -0,0 +1,321 @@
+"""
+Rule-based task parser for simple inputs.
+
+Handles inputs like "Gym at 7pm today" or "Call mom tomorrow 30 min" in microseconds
+and emits the same task schema as gpt_parser.parse_tasks_with_gpt, together with a
+confidence score so the pipeline can fall back to GPT for anything it isn't sure about.
+"""
+import re
+from datetime import datetime, timedelta
+
+from models import DEFAULT_DEADLINE_HOUR, DEFAULT_DURATION_MINUTES, TIMEZONE
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+          'september', 'october', 'november', 'december']
+_MONTH_PATTERN = '|'.join(MONTHS)
+
+# Clauses are separated by sentence punctuation, semicolons, newlines or commas
+_CLAUSE_SPLIT = re.compile(r'[;\n]+|\.(?!\d)|,(?!\s*\d{4})')
+
+_TIME = r'(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?'
+_RANGE_RE = re.compile(r'\bfrom\s+' + _TIME + r'\s*(?:to|-|until|till)\s*' + _TIME)
+_DEADLINE_RE = re.compile(r'\b(?:before|by|until|till|no later than)\s+' + _TIME + r'(?!\w)')
+_AT_RE = re.compile(r'(?:\bat|@)\s*' + _TIME + r'(?!\w)')
+_BARE_TIME_RE = re.compile(r'\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)(?!\w)')
+_NAMED_TIME_RE = re.compile(r'\b(?:at\s+)?(noon|midday|midnight)\b')
+_DEADLINE_NAMED_RE = re.compile(r'\b(?:before|by)\s+(noon|midday|end of (?:the )?day|eod|tonight)\b')
+# "before"/"by" right in front of a date reference makes the date (and a time right after it) a deadline
+_DEADLINE_PREFIX_RE = re.compile(r'\b(before|by|until|till|no later than)\s+$')
+_LEADING_TIME_RE = re.compile(r'\s*(?:at\s+|@\s*)?' + _TIME + r'(?!\w)')
+
+# "a"/"an" only count as an amount before a whole unit word, so "I am" isn't "a" + "m"
+_DURATION_RE = re.compile(
+    r'\b(?:for\s+)?(?:(\d+(?:\.\d+)?)\s*(hours?|hrs?|h|minutes?|mins?|m)'
+    r'|(an?|half an?)\s+(hours?|minutes?))\b'
+)
+
+_DAY_AFTER_TOMORROW_RE = re.compile(r'\bday after tomorrow\b')
+_TOMORROW_RE = re.compile(r'\b(?:tomorrow|tmrw|tmr)\b')
+_TODAY_RE = re.compile(r'\b(?:today|tonight)\b')
+_WEEKDAY_RE = re.compile(r'\b(?:(next|this|on)\s+)?(' + '|'.join(WEEKDAYS) + r')\b')
+_MONTH_DAY_RE = re.compile(r'\b(?:on\s+)?(' + _MONTH_PATTERN + r')\s+(\d{1,2})(?:st|nd|rd|th)?\b')
+_DAY_MONTH_RE = re.compile(r'\b(?:on\s+)?(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(' + _MONTH_PATTERN + r')\b')
+_ISO_DATE_RE = re.compile(r'\b(?:on\s+)?(\d{4})-(\d{1,2})-(\d{1,2})\b')
+
+_HIGH_PRIORITY_RE = re.compile(r'\b(?:urgent|urgently|asap|important|critical|high priority)\b')
+_LOW_PRIORITY_RE = re.compile(r'\b(?:low priority|whenever|if (?:i have |there\'s )?time|sometime)\b')
+
+# Phrases the rules can't interpret reliably; any of these sends the input to GPT
+_UNSUPPORTED_RE = re.compile(
+    r'\b(?:every|each|daily|weekly|monthly|reschedule|cancel|move|after|around|morning|afternoon|'
+    r'evening|later|next week|this week|weekend|between|and then)\b'
+    # "tonight" is a time of day unless it's the "by tonight" deadline
+    r'|(?<!by )(?<!before )\btonight\b'
+    # "in 30 minutes" is a start time relative to now, not a duration
+    r'|\bin\s+(?:\d+(?:\.\d+)?|an?|half an?)\s*(?:hours?|hrs?|h|minutes?|mins?|m)\b'
+)
+
+_FILLER_RE = re.compile(r'\b(?:i need to|i have to|i want to|need to|have to|remind me to|please|i should)\b')
+
+# Connectors left in a task name mean a deadline or a second task wasn't understood
+_CONNECTOR_RE = re.compile(r'\b(?:before|by|until|till|then)\b')
+
+def _to_24h(hour, minute, meridiem):
+    """Returns (hour, minute, ambiguous) for a matched time; times without am/pm are guessed."""
+    hour = int(hour)
+    minute = int(minute or 0)
+    if hour > 23 or minute > 59:
+        return None
+    if meridiem:
+        if hour > 12:
+            return None
+        pm = meridiem.startswith('p')
+        if hour == 12:
+            hour = 12 if pm else 0
+        elif pm:
+            hour += 12
+        return hour, minute, False
+    if hour >= 13 or hour == 0:
+        return hour, minute, False
+    # "at 7" is most likely 7pm, "at 9" most likely 9am
+    if hour <= 7:
+        hour += 12
+    return hour, minute, True
+
+def _resolve_date(clause, today):
+    """Returns (date, matched_span) for the first date reference in the clause, or (None, None)."""
+    match = _DAY_AFTER_TOMORROW_RE.search(clause)
+    if match:
+        return today + timedelta(days=2), match.span()
+    match = _TOMORROW_RE.search(clause)
+    if match:
+        return today + timedelta(days=1), match.span()
+    match = _TODAY_RE.search(clause)
+    if match:
+        return today, match.span()
+
+    match = _ISO_DATE_RE.search(clause)
+    if match:
+        try:
+            return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3))).date(), match.span()
+        except ValueError:
+            return None, None
+
+    for pattern, month_group, day_group in ((_MONTH_DAY_RE, 1, 2), (_DAY_MONTH_RE, 2, 1)):
+        match = pattern.search(clause)
+        if match:
+            month = MONTHS.index(match.group(month_group)) + 1
+            try:
+                date = datetime(today.year, month, int(match.group(day_group))).date()
+            except ValueError:
+                return None, None
+            if date < today:
+                date = date.replace(year=today.year + 1)
+            return date, match.span()
+
+    match = _WEEKDAY_RE.search(clause)
+    if match:
+        days_ahead = (WEEKDAYS.index(match.group(2)) - today.weekday()) % 7
+        if match.group(1) == 'next' and days_ahead == 0:
+            days_ahead = 7
+        return today + timedelta(days=days_ahead), match.span()
+
+    return None, None
+
+def _search_outside(pattern, clause, spans):
+    """First match of pattern that doesn't overlap text already consumed by another rule."""
+    for match in pattern.finditer(clause):
+        start, end = match.span()
+        if all(end <= used_start or start >= used_end for used_start, used_end in spans):
+            return match
+    return None
+
+def _duration_minutes(match):
+    amount, unit = match.group(1) or match.group(3), match.group(2) or match.group(4)
+    if amount.startswith('half'):
+        value = 0.5
+    elif amount in ('a', 'an'):
+        value = 1
+    else:
+        value = float(amount)
+    return int(round(value * 60 if unit.startswith('h') else value))
+
+def _remove_spans(clause, spans):
+    for start, end in sorted(spans, reverse=True):
+        clause = clause[:start] + ' ' + clause[end:]
+    return clause
+
+def _parse_clause(clause, original, today, user_priority):
+    """Parses one clause into a task dict and a confidence score in [0, 1]."""
+    confidence = 1.0
+    spans = []
+
+    if _UNSUPPORTED_RE.search(clause):
+        return None, 0.0
+
+    start = None
+    deadline = None
+    duration = None
+
+    date, span = _resolve_date(clause, today)
+    if span:
+        prefix = _DEADLINE_PREFIX_RE.search(clause, 0, span[0])
+        if prefix:
+            # "before Friday 5pm" / "by Monday at 3pm": a deadline on that date, not an appointment
+            span = (prefix.start(), span[1])
+            match = _LEADING_TIME_RE.match(clause, span[1])
+            if match:
+                parsed = _to_24h(*match.group(1, 2, 3))
+                if parsed is None:
+                    return None, 0.0
+                deadline = parsed[:2]
+                if parsed[2]:
+                    confidence -= 0.3
+                span = (span[0], match.end())
+            else:
+                deadline = (DEFAULT_DEADLINE_HOUR, 0)
+                if prefix.group(1) == 'before':
+                    # "before Friday" means done by the end of Thursday
+                    date -= timedelta(days=1)
+                    if date < today:
+                        return None, 0.0
+        spans.append(span)
+    has_date = date is not None
+    date = date or today
+
+    match = _search_outside(_RANGE_RE, clause, spans)
+    if match:
+        start_time = _to_24h(*match.group(1, 2, 3))
+        end_time = _to_24h(match.group(4), match.group(5), match.group(6) or match.group(3))
+        if start_time is None or end_time is None:
+            return None, 0.0
+        start = start_time[:2]
+        duration = (end_time[0] * 60 + end_time[1]) - (start[0] * 60 + start[1])
+        if duration <= 0:
+            return None, 0.0
+        if start_time[2]:
+            confidence -= 0.3
+        spans.append(match.span())
+
+    match = _search_outside(_DEADLINE_RE, clause, spans)
+    if match and deadline is not None:
+        # Two deadlines in one clause
+        return None, 0.0
+    if match:
+        parsed = _to_24h(*match.group(1, 2, 3))
+        if parsed is None:
+            return None, 0.0
+        deadline = parsed[:2]
+        if parsed[2]:
+            confidence -= 0.3
+        spans.append(match.span())
+    elif deadline is None:
+        match = _search_outside(_DEADLINE_NAMED_RE, clause, spans)
+        if match:
+            deadline = (12, 0) if match.group(1) in ('noon', 'midday') else (DEFAULT_DEADLINE_HOUR, 0)
+            spans.append(match.span())
+
+    if start is None:
+        match = _search_outside(_AT_RE, clause, spans) or _search_outside(_BARE_TIME_RE, clause, spans)
+        if match:
+            parsed = _to_24h(*match.group(1, 2, 3))
+            if parsed is None:
+                return None, 0.0
+            start = parsed[:2]
+            if parsed[2]:
+                confidence -= 0.3
+            spans.append(match.span())
+        else:
+            match = _search_outside(_NAMED_TIME_RE, clause, spans)
+            if match:
+                start = (0, 0) if match.group(1) == 'midnight' else (12, 0)
+                spans.append(match.span())
+
+    if duration is None:
+        match = _search_outside(_DURATION_RE, clause, spans)
+        if match:
+            duration = _duration_minutes(match)
+            spans.append(match.span())
+    if not duration:
+        duration = DEFAULT_DURATION_MINUTES
+
+    priority = user_priority or 'medium'
+    match = _search_outside(_HIGH_PRIORITY_RE, clause, spans)
+    if match:
+        priority = 'high'
+        spans.append(match.span())
+    else:
+        match = _search_outside(_LOW_PRIORITY_RE, clause, spans)
+        if match:
+            priority = 'low'
+            spans.append(match.span())
+
+    # Whatever is left is the task name; stray digits mean something wasn't understood
+    name = _remove_spans(clause, spans)
+    name = _FILLER_RE.sub(' ', name)
+    name = re.sub(r'\b(?:on|at|for|by|in|the)\s*$', ' ', name.strip())
+    name = re.sub(r'\s+', ' ', name).strip(" -:,")
+    if not name:
+        return None, 0.0
+    if re.search(r'\d', name):
+        confidence -= 0.5
+    if _CONNECTOR_RE.search(name):
+        confidence -= 0.5
+    if not has_date and start is None and deadline is None:
+        # Nothing in the clause ties it to a time; it may be a fragment of its neighbour
+        # ("Call mom, dad tomorrow at 5pm") rather than a task of its own
+        confidence -= 0.3
+
+    # Keep the user's capitalisation for the name where we can
+    index = original.lower().find(name)
+    name = original[index:index + len(name)] if index >= 0 else name
+    name = name[0].upper() + name[1:]
+
+    day = TIMEZONE.localize(datetime(date.year, date.month, date.day))
+    task = {
+        'task_name': name,
+        'duration': duration,
+        'priority': priority,
+        'date': date.strftime("%Y-%m-%d"),
+    }
+    if start is not None:
+        start_dt = day.replace(hour=start[0], minute=start[1])
+        task['start_time'] = start_dt.isoformat()
+        task['fixed'] = True
+        deadline_dt = start_dt + timedelta(minutes=duration)
+        if deadline is not None:
+            # "at 3pm before 5pm" is unusual enough to double-check with GPT
+            confidence -= 0.3
+    else:
+        task['fixed'] = False
+        deadline_dt = day.replace(hour=deadline[0], minute=deadline[1]) if deadline else day.replace(hour=DEFAULT_DEADLINE_HOUR)
+    task['deadline'] = deadline_dt.isoformat()
+
+    return task, max(confidence, 0.0)
+
+def parse_tasks_locally(user_input, user_priority):
+    """
+    Parses simple inputs (times, relative dates, weekdays, durations, "before X" deadlines)
+    into the parse_tasks_with_gpt task schema without an LLM call.
+    Returns (tasks, confidence); confidence is the lowest of any clause, and 0 when the
+    input uses anything the rules don't cover (recurrence, vague times, edits, ...).
+    """
+    today = datetime.now(TIMEZONE).date()
+    tasks = []
+    confidence = 1.0
+
+    for original in _CLAUSE_SPLIT.split(user_input):
+        original = original.strip()
+        if not original:
+            continue
+        task, clause_confidence = _parse_clause(original.lower(), original, today, user_priority)
+        if task is None:
+            return [], 0.0
+        tasks.append(task)
+        confidence = min(confidence, clause_confidence)
+
+    if not tasks:
+        return [], 0.0
+    return tasks, confidence
+
@@ -0,0 +1,232 @@
+"""
+Deterministic local scheduling engine.
+
+Places parsed tasks into free calendar slots without an LLM call, using
+fixed-time anchors first and then priority/deadline-ordered greedy placement.
+"""
+from models import DEFAULT_DURATION_MINUTES, Event, Task, at_hour, deadline_minutes, format_minutes, now_minutes, parse_minutes, to_datetime
+from free_time import BusyIndex, FreeTimeIndex
+
+PRIORITY_RANK = {'high': 0, 'medium': 1, 'low': 2}
+WORK_START_HOUR = 8
+WORK_END_HOUR = 19
+
+def _parse_busy(existing_events):
+    """(start, end) epoch minutes of every event in the per-day events context."""
+    busy = []
+    for events in (existing_events or {}).values():
+        for event in events:
+            event = Event.from_dict(event)
+            busy.append((event.start, event.end))
+    return busy
+
+def _parse_placement(task):
+    """Epoch-minute (start, end) of a proposed task; raises KeyError/TypeError/ValueError if they aren't valid times."""
+    return parse_minutes(task['start']), parse_minutes(task['end'])
+
+def local_batch_schedule(parsed_tasks, user_priority, multi_day_slots, existing_events=None, buffer_minutes=5):
+    """
+    Schedules parsed tasks locally in milliseconds instead of with an LLM call.
+    Fixed-time tasks are placed first as anchors; flexible tasks are then placed
+    greedily by priority (high > medium > low) and earliest deadline into the
+    earliest free slot that still meets the deadline, or the earliest slot after
+    it (marked "late"). Returns the same (scheduled, skipped, summary, insights)
+    tuple as agentic_batch_schedule.
+    """
+    free = FreeTimeIndex.from_slots(multi_day_slots)
+    busy = BusyIndex()
+    for busy_start, busy_end in _parse_busy(existing_events):
+        free.carve(busy_start, busy_end)
+        busy.add(busy_start, busy_end)
+
+    now = now_minutes()
+    tasks = [Task.from_dict(task, user_priority) for task in parsed_tasks]
+    fixed_tasks = sorted((t for t in tasks if t.start_time is not None), key=lambda t: t.start_time)
+    flexible_tasks = [t for t in tasks if t.start_time is None]
+
+    scheduled = []
+    skipped = []
+    late_count = 0
+    moved_fixed = 0
+
+    def place(task, start, status, reasoning):
+        end = start + task.duration
+        free.carve(start, end, buffer_minutes)
+        busy.add(start, end)
+        scheduled.append(task.placement(start, status, reasoning))
+
+    # Fixed anchors keep the time the user asked for, even outside working hours,
+    # as long as it doesn't collide with an existing event or another anchor
+    for task in fixed_tasks:
+        start = task.start_time
+        if not busy.overlaps(start, start + task.duration):
+            place(task, start, 'on-time', "Fixed at the requested time")
+        else:
+            # Requested time is taken: treat it as flexible from that point on
+            task.not_before = start
+            flexible_tasks.append(task)
+            moved_fixed += 1
+
+    flexible_tasks.sort(key=lambda t: (PRIORITY_RANK[t.priority], t.deadline))
+
+    for task in flexible_tasks:
+        not_before = max(task.not_before or now, now)
+        start = free.first_fit(task.duration, not_before, task.deadline)
+        if start is not None:
+            reasoning = "Requested time was busy; moved to the nearest free slot" if task.not_before is not None else \
+                f"Earliest free slot before the deadline ({task.priority} priority)"
+            place(task, start, 'on-time', reasoning)
+            continue
+
+        start = free.first_fit(task.duration, not_before)
+        if start is not None:
+            place(task, start, 'late', "No free slot before the deadline; placed in the earliest slot after it")
+            late_count += 1
+            continue
+
+        skipped.append({
+            'task_name': task.task_name,
+            'reason': "No available time slots in the requested date range"
+        })
+
+    scheduled.sort(key=lambda t: t['start'])
+
+    summary = (
+        f"Local scheduler placed {len(scheduled)} of {len(tasks)} tasks: fixed-time tasks first, "
+        f"then flexible tasks by priority and earliest deadline into the earliest free slot."
+    )
+    insights = []
+    if moved_fixed:
+        insights.append(f"{moved_fixed} fixed-time task(s) clashed with existing events and were moved to the nearest free slot")
+    if late_count:
+        insights.append(f"{late_count} task(s) could not meet their deadline and were scheduled late")
+    if skipped:
+        insights.append(f"{len(skipped)} task(s) did not fit in the available free time")
+
+    return scheduled, skipped, summary, insights
+
+def _placement_problem(start, end, now, free, busy):
+    """Returns why a placement is invalid, or None if it is fine."""
+    if end <= start:
+        return "ends before it starts"
+    if start < now:
+        return "is in the past"
+    if busy.overlaps(start, end):
+        return "overlaps an existing event or another scheduled task"
+    # Inside working hours the task must sit in free time; outside them (e.g. "gym at 7pm")
+    # the user asked for that time explicitly, so only conflicts with events count
+    window_start = at_hour(start, WORK_START_HOUR)
+    window_end = at_hour(start, WORK_END_HOUR)
+    inside_start, inside_end = max(start, window_start), min(end, window_end)
+    if inside_start < inside_end and not free.is_free(inside_start, inside_end):
+        return "falls outside the available free slots"
+    return None
+
+class ScheduleRepairer:
+    """
+    Stateful checker for LLM-produced placements. Each task is checked against existing
+    events, the free slots and every task accepted before it (overlaps, placements outside
+    the free slots, past times, double-booking). An offending task is moved locally to the
+    nearest free interval that still meets its deadline (from parsed_tasks, if given), or
+    the earliest one after it; tasks with nowhere to go are skipped. Tasks can be fed one
+    at a time as they arrive (streaming) or all at once via validate_and_repair_schedule.
+    """
+
+    def __init__(self, multi_day_slots, existing_events=None, parsed_tasks=None):
+        self.free = FreeTimeIndex.from_slots(multi_day_slots)
+        self.busy = BusyIndex()
+        for busy_start, busy_end in _parse_busy(existing_events):
+            self.free.carve(busy_start, busy_end)
+            self.busy.add(busy_start, busy_end)
+
+        self.deadlines = {
+            task.get('task_name'): deadline_minutes(task['deadline'])
+            for task in (parsed_tasks or []) if task.get('deadline')
+        }
+        self.now = now_minutes()
+
+    def repair(self, task):
+        """
+        Checks one proposed task and returns (task, skipped, note): the accepted (possibly
+        moved) task or None, a skipped-task entry or None, and a repair note or None.
+        """
+        try:
+            start, end = _parse_placement(task)
+        except (KeyError, TypeError, ValueError):
+            return None, {
+                'task_name': task.get('task_name', 'Unknown task'),
+                'reason': "AI returned an invalid start/end time"
+            }, None
+        return self._repair_placement(task, start, end)
+
+    def _repair_placement(self, task, start, end):
+        note = None
+        problem = _placement_problem(start, end, self.now, self.free, self.busy)
+        if problem is not None:
+            task_name = task.get('task_name', 'Unknown task')
+            duration = end - start if end > start else DEFAULT_DURATION_MINUTES
+            deadline = self.deadlines.get(task_name)
+            status = 'on-time' if deadline is not None else task.get('status', 'on-time')
+
+            new_start = self.free.nearest_fit(duration, start, deadline, not_before=self.now)
+            if new_start is None:
+                new_start = self.free.first_fit(duration, max(start, self.now))
+                status = 'late'
+            if new_start is None:
+                skipped = {'task_name': task_name, 'reason': f"Proposed time {problem} and no free slot was left"}
+                return None, skipped, f"Could not repair '{task_name}': proposed time {problem}"
+
+            note = (
+                f"Moved '{task_name}' from {to_datetime(start).strftime('%a %H:%M')} "
+                f"to {to_datetime(new_start).strftime('%a %H:%M')}: proposed time {problem}"
+            )
+            start, end = new_start, new_start + duration
+            task = dict(
+                task,
+                start=format_minutes(start),
+                end=format_minutes(end),
+                status=status,
+                reasoning=f"{task.get('reasoning', '')} (moved locally: proposed time {problem})".strip()
+            )
+
+        self.free.carve(start, end)
+        self.busy.add(start, end)
+        return task, None, note
+
+def validate_and_repair_schedule(scheduled_tasks, multi_day_slots, existing_events=None, parsed_tasks=None):
+    """
+    Checks a whole LLM-produced schedule in one sweep ordered by start time and repairs
+    conflicts locally (see ScheduleRepairer).
+    Returns (scheduled_tasks, skipped_tasks, repair_notes).
+    """
+    repairer = ScheduleRepairer(multi_day_slots, existing_events, parsed_tasks)
+
+    valid = []
+    skipped = []
+    repairs = []
+    placements = []
+
+    for task in scheduled_tasks:
+        try:
+            start, end = _parse_placement(task)
+        except (KeyError, TypeError, ValueError):
+            skipped.append({
+                'task_name': task.get('task_name', 'Unknown task'),
+                'reason': "AI returned an invalid start/end time"
+            })
+            continue
+        placements.append((start, end, task))
+
+    placements.sort(key=lambda placement: placement[0])
+
+    for start, end, task in placements:
+        task, skipped_task, note = repairer._repair_placement(task, start, end)
+        if note:
+            repairs.append(note)
+        if task is None:
+            skipped.append(skipped_task)
+        else:
+            valid.append(task)
+
+    valid.sort(key=lambda task: task['start'])
+    return valid, skipped, repairs
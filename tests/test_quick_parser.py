@@ -0,0 +1,57 @@
+"""
+Phrasings the rule-based parser has got wrong before. Each either parses into the expected
+tasks with enough confidence to skip GPT, or scores below the cutoff and falls back to GPT.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import TIMEZONE
+from quick_parser import WEEKDAYS, parse_tasks_locally
+
+# Default of pipeline.QUICK_PARSE_MIN_CONFIDENCE
+MIN_CONFIDENCE = 0.8
+
+# (task_name, fixed, days from today or a weekday name, start or deadline "HH:MM", duration)
+PARSED = [
+    ("Gym at 7pm today", [("Gym", True, 0, "19:00", 60)]),
+    ("Call mom tomorrow 30 min", [("Call mom", False, 1, "22:00", 30)]),
+    ("Finish report before 3pm", [("Finish report", False, 0, "15:00", 60)]),
+    ("Read for an hour tomorrow", [("Read", False, 1, "22:00", 60)]),
+    ("I am meeting Sam at 4pm", [("I am meeting Sam", True, 0, "16:00", 60)]),
+    ("Submit report before Friday 5pm", [("Submit report", False, "friday", "17:00", 60)]),
+    ("Send invoice by Monday at 3pm", [("Send invoice", False, "monday", "15:00", 60)]),
+    ("Pay bills before tomorrow", [("Pay bills", False, 0, "22:00", 60)]),
+    ("Finish slides by tonight", [("Finish slides", False, 0, "22:00", 60)]),
+]
+
+FALLBACK = [
+    "Yoga am",
+    "Call mom, dad tomorrow at 5pm",
+    "Email Bob then call Alice at 3pm",
+    "Call mom today in 30 minutes",
+    "Watch movie tonight",
+]
+
+def _when(task):
+    when = datetime.fromisoformat(task['start_time'] if task['fixed'] else task['deadline'])
+    return when.date(), when.strftime("%H:%M")
+
+@pytest.mark.parametrize("text, expected", PARSED)
+def test_parses_locally(text, expected):
+    today = datetime.now(TIMEZONE).date()
+    tasks, confidence = parse_tasks_locally(text, 'medium')
+
+    assert confidence >= MIN_CONFIDENCE
+    got = [(task['task_name'], task['fixed'], *_when(task), task['duration']) for task in tasks]
+    want = []
+    for name, fixed, day, time, duration in expected:
+        if isinstance(day, str):
+            day = (WEEKDAYS.index(day) - today.weekday()) % 7
+        want.append((name, fixed, today + timedelta(days=day), time, duration))
+    assert got == want
+
+@pytest.mark.parametrize("text", FALLBACK)
+def test_falls_back_to_gpt(text):
+    tasks, confidence = parse_tasks_locally(text, 'medium')
+    assert confidence < MIN_CONFIDENCE, tasks